@@ -0,0 +1,59 @@
+import os
+
+from PIL import Image, ImageTk, ImageEnhance
+
+# Images used by the checkout screens: name -> (file, size to show it at)
+PAYMENT_ASSETS = {
+    'qr': ("qrcode.jpg", (250, 200)),
+    'cash': ("cash.jpg", (250, 200)),
+    'buymeacoffee': ("buymeacoffee.jpg", (400, 400)),
+}
+
+
+class AssetCache:
+    # Decodes and resizes each image once and keeps a darkened copy next to it for
+    # hover effects. The Tk PhotoImages are made on first use (they need a Tk root,
+    # and must be made on the thread that owns it) and then reused, so a hover or
+    # opening a payment window costs a dictionary lookup, not a JPEG decode.
+    # refresh() re-reads only the files whose modification time changed.
+    def __init__(self, assets=PAYMENT_ASSETS, darken=0.5):
+        self.assets = assets
+        self.darken = darken  # Brightness factor of the hover version
+        self.images = {}  # name -> (mtime, image, darkened image)
+        self.photos = {}  # name -> (PhotoImage, darkened PhotoImage)
+        self.missing = set()  # Names already reported as unreadable
+        self.refresh()
+
+    def refresh(self):
+        for name, (path, size) in self.assets.items():
+            try:
+                mtime = os.path.getmtime(path)
+                if name in self.images and self.images[name][0] == mtime:
+                    continue
+                img = Image.open(path).convert("RGB")
+                img = img.resize(size, Image.Resampling.LANCZOS)  # Resize the image to fit the frame
+            except Exception as e:
+                if name not in self.missing:
+                    print(f"Error loading {name} image: {e}")
+                    self.missing.add(name)
+                self.images.pop(name, None)
+                self.photos.pop(name, None)
+                continue
+
+            darkened = ImageEnhance.Brightness(img).enhance(self.darken)
+            self.images[name] = (mtime, img, darkened)
+            self.photos.pop(name, None)  # Made again from the new file on next use
+            self.missing.discard(name)
+
+    def photo(self, name, dark=False):
+        # PhotoImage for an asset (None if its file couldn't be read)
+        if name not in self.images:
+            return None
+        if name not in self.photos:
+            _, img, darkened = self.images[name]
+            self.photos[name] = (ImageTk.PhotoImage(img), ImageTk.PhotoImage(darkened))
+        return self.photos[name][1 if dark else 0]
+
+    def forget_photos(self):
+        # Call when the Tk root goes away: its PhotoImages die with it
+        self.photos.clear()
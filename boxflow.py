@@ -0,0 +1,59 @@
+import cv2
+import numpy as np
+
+
+class BoxFlow:
+    # Keeps the last detection boxes lined up with the live picture between inferences.
+    # A few points inside each box are followed from the frame the detections came from
+    # to the frame being shown with sparse Lucas-Kanade optical flow, and each box is
+    # moved by the median shift of its points. Much cheaper than running the model.
+    def __init__(self, scale=0.5):
+        self.scale = scale  # Work on a downscaled grayscale picture
+        self.previous = None  # Grayscale of the last frame the points were found in
+        self.points = None  # (N, 1, 2) float32 tracked points
+        self.owners = None  # Box index of every point
+        self.offsets = np.zeros((0, 2))  # Current shift of every box, in full-size pixels
+        self.key = None  # Identifies the detections the points belong to
+
+    def gray(self, frame):
+        small = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def reset(self, key, frame, boxes):
+        # New detections: seed five points per box (centre and four inset corners)
+        self.key = key
+        self.previous = self.gray(frame)
+        self.offsets = np.zeros((len(boxes), 2))
+        points = []
+        owners = []
+        for index, (x1, y1, x2, y2) in enumerate(boxes):
+            dx = (x2 - x1) / 4
+            dy = (y2 - y1) / 4
+            for px, py in ((x1 + x2) / 2, (y1 + y2) / 2), (x1 + dx, y1 + dy), (x2 - dx, y1 + dy), \
+                          (x1 + dx, y2 - dy), (x2 - dx, y2 - dy):
+                points.append((px * self.scale, py * self.scale))
+                owners.append(index)
+        self.points = np.array(points, dtype=np.float32).reshape(-1, 1, 2)
+        self.owners = np.array(owners, dtype=int)
+
+    def update(self, frame):
+        # Follow the points into this frame; returns the (dx, dy) shift of every box
+        if self.previous is None or not len(self.points):
+            return self.offsets
+
+        gray = self.gray(frame)
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(self.previous, gray, self.points, None,
+                                                    winSize=(15, 15), maxLevel=2)
+        found = status.reshape(-1) == 1
+        shifts = (moved - self.points).reshape(-1, 2) / self.scale
+
+        for index in range(len(self.offsets)):
+            mine = found & (self.owners == index)
+            if mine.any():
+                self.offsets[index] += np.median(shifts[mine], axis=0)
+
+        # Keep following only the points that were found
+        self.points = moved[found].reshape(-1, 1, 2)
+        self.owners = self.owners[found]
+        self.previous = gray
+        return self.offsets
@@ -0,0 +1,142 @@
+import numpy as np
+
+from promotions import PromotionEngine
+
+
+def to_cents(prices):
+    # Dollar prices (ints or floats) to exact integer cents
+    return np.round(np.asarray(prices, dtype=float) * 100).astype(np.int64)
+
+
+def format_cents(cents):
+    # 1999 -> "19.99", without going through a float
+    sign = "-" if cents < 0 else ""
+    cents = abs(int(cents))
+    return f"{sign}{cents // 100}.{cents % 100:02d}"
+
+
+class CartSnapshot:
+    # Frozen copy of a cart, cheap enough to take on every Scan and safe to hand
+    # to another thread: only the lines with items in them are kept
+    def __init__(self, counts, unit_cents, total_cents, deals=()):
+        self.classes = np.flatnonzero(counts)
+        self.counts = counts[self.classes]
+        self.unit_cents = unit_cents[self.classes]
+        self.total_cents = int(total_cents)  # Before promotions
+        self.deals = tuple(deals)  # (rule index, name, times applied, cents saved)
+        self.discount_cents = sum(saving for _, _, _, saving in self.deals)
+        self.due_cents = self.total_cents - self.discount_cents  # What the customer pays
+
+    def lines(self, names):
+        # (item name, unit price, quantity, line total) rows, money in cents
+        return [(names[cls], int(unit), int(count), int(unit * count))
+                for cls, unit, count in zip(self.classes, self.unit_cents, self.counts)]
+
+    def line(self, cls):
+        # (quantity, unit price) of one class id, (0, 0) when it isn't in the cart
+        index = np.searchsorted(self.classes, cls)
+        if index < len(self.classes) and self.classes[index] == cls:
+            return int(self.counts[index]), int(self.unit_cents[index])
+        return 0, 0
+
+    def changed(self, other):
+        # Class ids whose quantity or price differs from another snapshot (None = empty cart)
+        if other is None:
+            return [int(cls) for cls in self.classes]
+        mine = dict(zip(self.classes.tolist(), zip(self.counts.tolist(), self.unit_cents.tolist())))
+        theirs = dict(zip(other.classes.tolist(), zip(other.counts.tolist(), other.unit_cents.tolist())))
+        return sorted(cls for cls in mine.keys() | theirs.keys() if mine.get(cls) != theirs.get(cls))
+
+    def deals_changed(self, other):
+        # Rule indexes whose deal line differs from another snapshot's (None = empty cart)
+        mine = {deal[0]: deal for deal in self.deals}
+        theirs = {deal[0]: deal for deal in other.deals} if other is not None else {}
+        return sorted(index for index in mine.keys() | theirs.keys() if mine.get(index) != theirs.get(index))
+
+    def deal(self, index):
+        # (name, times applied, cents saved) of one rule, None when it isn't applied
+        for rule, name, times, saving in self.deals:
+            if rule == index:
+                return name, times, saving
+        return None
+
+
+class Cart:
+    # Line items as arrays indexed by model class id, money in integer cents.
+    # The running total is adjusted by each change instead of summing the cart
+    # again, so adding an item is O(1) and replacing the whole cart
+    # with a frame's counts only costs the classes whose count changed.
+    # Promotions (see promotions.py) follow the same way: only the rules that use a
+    # changed class are re-evaluated.
+    def __init__(self, unit_cents, rules=()):
+        self.unit_cents = np.array(unit_cents, dtype=np.int64)  # Price per class id
+        self.counts = np.zeros(len(self.unit_cents), dtype=np.int64)  # Quantity per class id
+        self.total_cents = 0  # Before promotions
+        self.promotions = PromotionEngine(list(rules), len(self.unit_cents))
+
+    def add(self, cls, quantity=1):
+        self.counts[cls] += quantity
+        self.total_cents += quantity * int(self.unit_cents[cls])
+        self.promotions.update((cls,), self.counts, self.unit_cents)
+
+    def set_counts(self, counts):
+        # Make the cart hold exactly these per-class counts; returns the class ids that changed
+        changed = np.flatnonzero(counts != self.counts)
+        if len(changed):
+            self.total_cents += int((counts[changed] - self.counts[changed]) @ self.unit_cents[changed])
+            self.counts[changed] = counts[changed]
+            self.promotions.update(changed, self.counts, self.unit_cents)
+        return changed
+
+    def reprice(self, unit_cents):
+        # New prices (the catalog changed): the only time the total is worked out in full
+        self.unit_cents = np.array(unit_cents, dtype=np.int64)
+        self.total_cents = int(self.counts @ self.unit_cents)
+        self.promotions.update_all(self.counts, self.unit_cents)
+
+    def set_rules(self, rules):
+        # New promotions (the promotion file changed)
+        self.promotions = PromotionEngine(list(rules), len(self.unit_cents))
+        self.promotions.update_all(self.counts, self.unit_cents)
+
+    def due_cents(self):
+        return self.total_cents - self.promotions.discount_cents
+
+    def snapshot(self):
+        return CartSnapshot(self.counts, self.unit_cents, self.total_cents, self.promotions.deals())
+
+
+if __name__ == "__main__":
+    # Self-check: python cart.py. Random carts through add, set_counts, reprice and
+    # set_rules must always match a cart (and promotions) worked out from scratch.
+    import random
+
+    from promotions import compile_rules
+
+    names = ['apple', 'banana', 'orange', 'bottle', 'mouse']
+    rules = compile_rules([{"type": "multibuy", "item": "apple", "quantity": 3, "price": 2.5},
+                           {"type": "bundle", "items": {"banana": 1, "orange": 2}, "price": 4},
+                           {"type": "discount", "item": "bottle", "percent": 15}], names)
+    assert to_cents([1.99, 2.9, 0.1 + 0.2]).tolist() == [199, 290, 30]
+    assert [format_cents(value) for value in (0, 5, 1999, -250)] == ["0.00", "0.05", "19.99", "-2.50"]
+
+    cart = Cart(to_cents([1.99, 2.9, 0.35, 4, 12.5]), rules)
+    for step in range(5000):
+        choice = random.random()
+        if choice < 0.4:
+            cart.add(random.randrange(len(names)), random.randrange(1, 4))
+        elif choice < 0.9:
+            cart.set_counts(np.random.randint(0, 8, len(names)))
+        elif choice < 0.97:
+            cart.reprice(np.random.randint(1, 2000, len(names)))
+        else:
+            cart.set_rules(rules[:random.randrange(len(rules) + 1)])
+
+        fresh = PromotionEngine(cart.promotions.rules, len(names))
+        fresh.update_all(cart.counts, cart.unit_cents)
+        assert cart.total_cents == int(cart.counts @ cart.unit_cents), step
+        assert cart.promotions.discount_cents == fresh.discount_cents, step
+        snapshot = cart.snapshot()
+        assert snapshot.due_cents == cart.due_cents() == cart.total_cents - fresh.discount_cents, step
+        assert sum(line for _, _, _, line in snapshot.lines(names)) == snapshot.total_cents, step
+    print("cart.py: all checks passed")
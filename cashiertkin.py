@@ -1,150 +1,97 @@
 import tkinter as tk
 from tkinter import ttk
-from collections import defaultdict
-from PIL import Image, ImageTk, ImageEnhance  # Added ImageEnhance for brightness adjustments
+from assetcache import AssetCache
+from cart import Cart, format_cents, to_cents
+from pricecatalog import PriceCatalog, price_file
+from promotions import PromotionCatalog
 
 class CashierCheckout:
     def __init__(self):
-        # Initialize detected objects
-        self.detected_objects = defaultdict(lambda: {'count': 0, 'total': 0})  # Track detected items
-        self.prices = {
-            "apple": 1.99,
-            "banana": 2.9,
-            "orange": 3.99,
-        }
+        self.catalog = PriceCatalog(path=price_file("prices_cashiertkin.json"))  # The demo's own prices
+        # The cart counts items by index into item_names, in integer cents with a running total
+        self.item_names = sorted(set(self.catalog.prices) | {'apple', 'banana'})
+        self.promotions = PromotionCatalog(self.item_names)  # Deals from promotions.json
+        self.cart = Cart(self.item_cents(), self.promotions.rules)
         # Example items for testing
-        self.detected_objects['apple']['count'] = 2
-        self.detected_objects['apple']['total'] = 2 * self.prices['apple']
-        self.detected_objects['banana']['count'] = 3
-        self.detected_objects['banana']['total'] = 3 * self.prices['banana']
+        self.cart.add(self.item_names.index('apple'), 2)
+        self.cart.add(self.item_names.index('banana'), 3)
 
-        # Calculate total price
-        self.total_price = sum(data['total'] for data in self.detected_objects.values())
-
-        # Load the QR code, Cash, and Buy Me a Coffee images (to be done in separate methods)
+        # Payment images, decoded and resized once here instead of on every checkout
+        self.assets = AssetCache()
         self.qr_code_image = None
         self.cash_image = None
         self.buymeacoffee_image = None
-        self.original_qr_image = None
-        self.original_cash_image = None
+
+        # The checkout screen is built once and refreshed in place afterwards
+        self.tk_window = None
+        self.item_rows = {}  # Item name -> row values currently in the Treeview
+
+    def item_cents(self):
+        return to_cents([self.catalog.prices.get(name, 0) for name in self.item_names])
 
     def load_qr_code_image(self):
-        try:
-            img = Image.open("qrcode.jpg")  # Adjust the path if necessary
-            img = img.resize((250, 200), Image.Resampling.LANCZOS)  # Resize the image to fit the frame
-            self.qr_code_image = ImageTk.PhotoImage(img)
-            self.original_qr_image = img  # Store the original image
-        except Exception as e:
-            print(f"Error loading QR code image: {e}")
+        self.qr_code_image = self.assets.photo('qr')  # Decoded and resized once, at startup
 
     def load_cash_image(self):
-        try:
-            img = Image.open("cash.jpg")  # Adjust the path if necessary
-            img = img.resize((250, 200), Image.Resampling.LANCZOS)  # Resize the image to fit the frame
-            self.cash_image = ImageTk.PhotoImage(img)
-            self.original_cash_image = img  # Store the original image
-        except Exception as e:
-            print(f"Error loading cash image: {e}")
+        self.cash_image = self.assets.photo('cash')
 
     def load_buymeacoffee_image(self):
-        try:
-            img = Image.open("buymeacoffee.jpg")  # Adjust the path if necessary
-            img = img.resize((400, 400), Image.Resampling.LANCZOS)  # Resize the image to a larger size
-            self.buymeacoffee_image = ImageTk.PhotoImage(img)
-        except Exception as e:
-            print(f"Error loading Buy Me a Coffee image: {e}")
+        self.buymeacoffee_image = self.assets.photo('buymeacoffee')
 
     def darken_qr_image(self):
-        enhancer = ImageEnhance.Brightness(self.original_qr_image)
-        darkened_img = enhancer.enhance(0.5)  # Darken the image
-        self.qr_code_image = ImageTk.PhotoImage(darkened_img)
+        # Hover versions are precomputed too, so hovering costs nothing
+        self.qr_code_image = self.assets.photo('qr', dark=True)
         return self.qr_code_image
 
     def restore_qr_image(self):
-        self.qr_code_image = ImageTk.PhotoImage(self.original_qr_image)
+        self.qr_code_image = self.assets.photo('qr')
         return self.qr_code_image
 
     def darken_cash_image(self):
-        enhancer = ImageEnhance.Brightness(self.original_cash_image)
-        darkened_img = enhancer.enhance(0.5)  # Darken the image
-        self.cash_image = ImageTk.PhotoImage(darkened_img)
+        self.cash_image = self.assets.photo('cash', dark=True)
         return self.cash_image
 
     def restore_cash_image(self):
-        self.cash_image = ImageTk.PhotoImage(self.original_cash_image)
+        self.cash_image = self.assets.photo('cash')
         return self.cash_image
 
     def display_price_window(self):
-        self.tk_window = tk.Tk()
-        self.tk_window.title("Cashier Checkout")
-        self.tk_window.attributes("-fullscreen", True)
-        self.tk_window.configure(bg="#F8F9F0")  # Light gray background
-
-        title_label = tk.Label(self.tk_window, text="Cashier Checkout", font=("Helvetica", 40, "bold"), bg="#F8F9F0", fg="#333333")
-        title_label.pack(pady=20)
-
-        frame = tk.Frame(self.tk_window, bg="#FFFFFF", bd=2, relief="raised")
-        frame.pack(fill="both", expand=True, padx=20, pady=20)
-
-        separator = ttk.Separator(self.tk_window, orient="horizontal")
-        separator.pack(fill="x", padx=20)
-
-        # Load the images
-        self.load_qr_code_image()
-        self.load_cash_image()
-
-        columns = ("Item", "Price", "Quantity", "Total")
-        item_list = ttk.Treeview(frame, columns=columns, show='headings', height=10)
-
-        item_list.heading("Item", text="Item")
-        item_list.heading("Price", text="Price ($)")
-        item_list.heading("Quantity", text="Quantity")
-        item_list.heading("Total", text="Total ($)")
-
-        item_list.column("Item", width=300, anchor="center")
-        item_list.column("Price", width=200, anchor="center")
-        item_list.column("Quantity", width=200, anchor="center")
-        item_list.column("Total", width=200, anchor="center")
-
-        style = ttk.Style()
-        style.configure("Treeview", font=("Helvetica", 18), rowheight=40)
-        style.configure("Treeview.Heading", font=("Helvetica", 24, "bold"))
-
-        for item_name, data in self.detected_objects.items():
-            price = self.prices.get(item_name.lower(), 0)
-            count = data['count']
-            total_for_item = data['total']
-            item_list.insert("", "end", values=(item_name.capitalize(), f"{price:.2f}", count, f"{total_for_item:.2f}"))
-
-        item_list.pack(fill="both", expand=True)
-
-        total_price_text = f"Total Price: ${self.total_price:.2f}"
-        total_price_label = tk.Label(frame, text=total_price_text, font=("Helvetica", 28, "bold"), bg="#FFFFFF", fg="#D9534F")
-        total_price_label.pack(pady=20)
-
-        button_frame = tk.Frame(self.tk_window, bg="#F8F9F0")
-        button_frame.pack(pady=20)
-
-        retry_button = ttk.Button(button_frame, text="Retry", command=self.retry_action, style="Accent.TButton")
-        retry_button.grid(row=0, column=0, padx=20, pady=10)
-
-        quit_button = ttk.Button(button_frame, text="Quit", command=self.close_cashier_checkout, style="Accent.TButton")
-        quit_button.grid(row=0, column=1, padx=20, pady=10)
-
-        checkout_button = ttk.Button(button_frame, text="Checkout", command=self.checkout_action, style="Accent.TButton")
-        checkout_button.grid(row=0, column=2, padx=20, pady=10)
-
-        style.configure("Accent.TButton", font=("Helvetica", 18, "bold"), padding=10)
-        style.map("Accent.TButton", foreground=[('active', '#FFFFFF')], background=[('active', '#D9534F')])
-
-        self.tk_window.mainloop()
+        # Show the current cart, building the screen on first use. Rows are diffed
+        # against what is already in the table so an unchanged item costs nothing.
+        if self.tk_window is None:
+            self.build_price_window()
+        self.assets.refresh()  # Picks up a replaced image file (only files whose mtime changed)
+
+        rows = {}
+        for item_name, price, count, total_for_item in self.cart.snapshot().lines(self.item_names):
+            rows[item_name] = (item_name.capitalize(), format_cents(price), count, format_cents(total_for_item))
+        for index, name, times, saving in self.cart.promotions.deals():
+            rows[f"deal{index}"] = (name, "", times, f"-{format_cents(saving)}")
+
+        for item_name in self.item_rows.keys() - rows.keys():
+            self.item_list.delete(item_name)
+        for index, (item_name, values) in enumerate(rows.items()):
+            if item_name not in self.item_rows:
+                self.item_list.insert("", index, iid=item_name, values=values)
+            else:
+                if self.item_rows[item_name] != values:
+                    self.item_list.item(item_name, values=values)
+                self.item_list.move(item_name, "", index)
+        self.item_rows = rows
+
+        total_text = f"Total Price: ${format_cents(self.cart.due_cents())}"
+        if self.cart.promotions.discount_cents:
+            total_text += f"  (you save ${format_cents(self.cart.promotions.discount_cents)})"
+        self.total_price_label.config(text=total_text)
+        self.tk_window.deiconify()
+        self.tk_window.lift()
 
     def checkout_action(self):
         checkout_window = tk.Toplevel(self.tk_window)
         checkout_window.title("Checkout Confirmation")
         checkout_window.geometry("600x500")
 
-        price_label = tk.Label(checkout_window, text=f"Total Price: ${self.total_price:.2f}", font=("Helvetica", 30, "bold"), fg="#D9534F")
+        price_label = tk.Label(checkout_window, text=f"Total Price: ${format_cents(self.cart.due_cents())}", font=("Helvetica", 30, "bold"), fg="#D9534F")
         price_label.pack(pady=20)
 
         paymentmethod_label = tk.Label(checkout_window, text=f'Select Payment Method', font=("Helvetica", 30, "bold"))
@@ -214,14 +161,23 @@ class CashierCheckout:
         print("Cash clicked!")
 
     def retry_action(self):
-        if hasattr(self, 'tk_window') and self.tk_window.winfo_exists():
-            self.tk_window.destroy()
+        # Re-read the cart into the same screen instead of building a new one,
+        # re-pricing it if its price file or promotions.json was edited in the meantime
+        if self.catalog.reload():
+            self.cart.reprice(self.item_cents())
+        if self.promotions.reload():
+            self.cart.set_rules(self.promotions.rules)
+        self.display_price_window()
 
     def close_cashier_checkout(self):
-        if hasattr(self, 'tk_window') and self.tk_window.winfo_exists():
+        if self.tk_window is not None:
             self.tk_window.destroy()
+            self.tk_window = None
+            self.item_rows = {}
+            self.assets.forget_photos()  # They belonged to the root that was just destroyed
 
 
 if __name__ == "__main__":
     cashier = CashierCheckout()
     cashier.display_price_window()
+    cashier.tk_window.mainloop()
@@ -1,49 +1,127 @@
 import cv2
+import gc
+import queue
 import threading
+import time
 import numpy as np
-from collections import defaultdict
-from ultralytics import YOLO
+from detector import load_model
 import tkinter as tk
 from tkinter import ttk
-from collections import defaultdict
-from PIL import Image, ImageTk, ImageEnhance  # Added ImageEnhance for brightness adjustments
+from framebuffer import FrameExchange, FrameGrabber
+from skipcontroller import FrameSkipController, preview_sizes
+from motiongate import MotionGate
+from cart import Cart, format_cents
+from detections import box_arrays, count_classes
+from pricecatalog import PriceCatalog
+from promotions import PromotionCatalog
+from tracker import ObjectTracker
+from inferworker import InferenceWorker
+from boxflow import BoxFlow
+from assetcache import AssetCache
+from overlay import OverlayCompositor, render
+from snapshotstore import SnapshotStore
+from latency import LatencyStats
+
+# "Scan", "Retry" and "Quit": top-left corner of each button, as checked by the mouse callback
+BUTTONS = (("Scan", (30, 30)), ("Retry", (180, 30)), ("Quit", (330, 30)))
+
+
+def render_button(label):
+    # One 120x50 button, rendered once by the overlay compositor
+    return render([('rect', (0, 0), (120, 50), (200, 200, 200)),
+                   ('text', label, (20, 35), 1, (0, 0, 0), 2)], 121, 51)
+
 
 class MobileCamera:
-    def __init__(self):
+    def __init__(self, backend='torch', worker_process=False, model=None,
+                 preview_imgsz=320, scan_imgsz=960, scan_weights=None, photo_format='jpg', photo_quality=90,
+                 latency_stats=False, snapshots=None):
         # Load YOLOv8 model for object detection
-        self.model = YOLO('yolov8n.pt')  # Use 'yolov8n.pt' or any desired model
+        # backend: 'torch' (PyTorch), 'onnx' / 'openvino' for faster CPU-only inference,
+        # or 'onnx-int8' for the quantized model (refused until int8report.py has written int8_report.txt)
+        # model: an already loaded model to share (see multilane.py) instead of loading one
+        # preview_imgsz / scan_imgsz: model input size for the live preview and for Scan
+        # scan_weights: a larger model (e.g. 'yolov8s.pt') to use for Scan only
+        # photo_format / photo_quality: how captured photos are saved ('jpg', 'webp' or 'png')
+        # latency_stats: start with per-stage timing on (also toggled with the 't' key)
+        # snapshots: an already open SnapshotStore to share (see multilane.py) instead of opening one
+        if model is not None:
+            self.worker = None
+            self.model = model
+            self.names = model.names
+        elif worker_process:
+            # Run the model in its own process so the preview doesn't wait on inference
+            self.worker = InferenceWorker('yolov8n.pt', backend)
+            self.model = None
+            self.names = self.worker.names
+        else:
+            self.worker = None
+            self.model = load_model('yolov8n.pt', backend)  # Use 'yolov8n.pt' or any desired model
+            self.names = self.model.names
+
+        # Two tiers: the preview only has to look right, so it runs small and fast;
+        # pressing Scan re-runs detection on the full-resolution frame at scan_imgsz
+        self.scan_imgsz = scan_imgsz
+        self.scan_timeout = 10  # Seconds Scan waits for the inference worker before giving up
+        if scan_weights is not None:
+            self.scan_model = load_model(scan_weights, backend, warmup_size=scan_imgsz)
+        else:
+            self.scan_model = self.model  # None with the worker process: scans go through the worker
+        self.grabber = None
         self.frame = None
         self.running = True
-        self.frame_skip = 0  # Initialize frame skip
+        self.decode_scale = 1  # 1 = full size, 2 or 4 = decode camera JPEGs at 1/2 or 1/4 size
+        # Picks the inference stride and preview imgsz (preview_imgsz or smaller) from measured latency
+        self.skip_controller = FrameSkipController(sizes=preview_sizes(preview_imgsz))
         self.photo_count = 0  # To count the saved photos
-        self.total_price = 0  # To accumulate the total price
-        self.detected_objects = defaultdict(lambda: {'count': 0, 'total': 0})  # Track each object and its total cost
+        self.lane = 1  # Checkout lane recorded with every photo (set per lane by multilane.py)
+        # Saves photos in the background into an indexed archive (snapshots/, see snapshotstore.py)
+        if snapshots is None:
+            snapshots = SnapshotStore(file_format=photo_format, quality=photo_quality)
+        self.snapshots = snapshots
         self.show_price_window = False  # Flag to control the display of the price window
-
-
-
-        # Dictionary to store prices for specific object classes
-        self.prices = {
-            "apple": 1,  # Price of an apple is $1
-            "banana": 2,  # Price of a banana is $2
-            "orange": 3,
-            "bottle": 4,
-            "mouse": 5,
-            "carrot": 6,
-            "chair": 20,
-
-
-
-        }
-
-        # Calculate total price
-        self.total_price = sum(data['total'] for data in self.detected_objects.values())
-
-        # Load the QR code and Cash images (to be done in separate methods)
+        self.detections = []  # Boxes from the last inference: [x1, y1, x2, y2, class id]
+        self.motion_gate = MotionGate()  # Skips inference while nothing in front of the camera moves
+        self.tracker = ObjectTracker()  # Gives each physical item a persistent id across frames
+        # The preview runs at camera rate and inference at its own rate in the background;
+        # keyframe is (frame the detections came from, detections), swapped in one assignment
+        self.keyframe = (None, [])
+        self.detect_lock = threading.Lock()  # One model call or scan at a time
+        self.worker_frames = {}  # Worker job id -> frame it was submitted with
+        self.follow_motion = True  # Shift the last boxes with optical flow between inferences ('f' key)
+        self.box_flow = BoxFlow()
+        self.overlay = OverlayCompositor()  # Buttons as cached sprites; text is cheaper drawn with putText
+        # Per-stage latency histograms, shown on the preview while on; 'p' writes them to latency.txt
+        self.latency = LatencyStats(enabled=latency_stats)
+
+
+
+        # Prices for specific object classes, from prices.json; editing the file
+        # changes them while the camera keeps running
+        self.catalog = PriceCatalog(self.names)
+        # Multi-buy, bundle and discount deals from promotions.json, also picked up while running
+        self.promotions = PromotionCatalog(self.names)
+        # What is being billed: counts per class id with a running total, in integer cents
+        self.cart = Cart(self.catalog.table.cents, self.promotions.rules)
+        self.use_prices()
+        self.show_unpriced = False  # Debug toggle ('u' key): detect every class and mark unpriced ones
+
+        # The checkout window runs on its own thread with its own Tk mainloop, so the camera
+        # and detection keep going while a customer pays; scans reach it as cart snapshots
+        self.checkout_carts = queue.Queue()  # Cart snapshots waiting to be shown, oldest first
+        self.checkout_commands = queue.Queue()  # 'close' requests from the OpenCV side
+        self.checkout_thread = None
+        self.checkout_cart = None  # Snapshot on screen, only touched by the checkout thread
+        self.checkout_shown = None  # Cart snapshot the checkout Treeview rows currently show
+        self.checkout_popups = []  # Payment windows opened from the checkout screen
+        self.checkout_times = []  # Milliseconds from Scan to the checkout screen being drawn
+        self.capture_until = None  # When to close the "Captured Photo" window
+
+        # Payment images, decoded and resized once here instead of on every checkout
+        self.assets = AssetCache()
         self.qr_code_image = None
         self.cash_image = None
-        self.original_qr_image = None
-        self.original_cash_image = None
+        self.buymeacoffee_image = None
 
     def getVideo(self, camera):
         self.camera = camera
@@ -53,17 +131,29 @@ class MobileCamera:
         cap.set(cv2.CAP_PROP_FRAME_WIDTH, 960)
         cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
 
-        # Function to capture frames in a separate thread
-        def capture_frames():
-            while self.running:
-                ret, frame = cap.read()
-                if ret:
-                    self.frame = frame
+        # Frames go from the capture thread to this loop through a sequence-numbered
+        # exchange, so the loop only wakes up for frames it has not processed yet
+        self.frames = FrameExchange()
+        reader = self.frames.reader()
+
+        # The preview shows every frame, so decode every frame (still only once the
+        # display has taken the last one); inference picks its own frames from a second reader
+        grabber = FrameGrabber(cap, self.frames, decode_stride=1, decode_scale=self.decode_scale,
+                               stats=self.latency)
+        self.grabber = grabber
 
         # Start a thread to capture frames
-        thread = threading.Thread(target=capture_frames)
+        thread = threading.Thread(target=grabber.run, args=(lambda: self.running,))
         thread.start()
 
+        # Without the worker process the model runs on its own thread, so a slow
+        # inference no longer holds up the preview
+        inference_thread = None
+        last_seq = 0  # Last frame handed to the worker process
+        if self.worker is None:
+            inference_thread = threading.Thread(target=self.inference_loop, args=(self.frames.reader(),))
+            inference_thread.start()
+
         def mouse_callback(event, x, y, flags, param):
             if event == cv2.EVENT_LBUTTONDOWN:
                 # Check if the "Scan" button was clicked
@@ -83,188 +173,422 @@ class MobileCamera:
         cv2.setMouseCallback("Mobile Cam - Object Detection", mouse_callback)
 
         while True:
-            if self.frame is not None:
-                # Skip every 2nd frame to reduce processing load
-                if self.frame_skip % 2 == 0:
-                    # Detect objects using YOLOv8 model
-                    results = self.model(self.frame)
-
-                    # Reset detected objects and total price for this frame
-                    self.detected_objects.clear()
-                    self.total_price = 0
-
-                    # Loop over detected objects
-                    # Loop over detected objects
-                    for result in results:
-                        boxes = result.boxes
-                        for box in boxes:
-                            # Extract bounding box and confidence score
-                            x1, y1, x2, y2 = map(int, box.xyxy[0])
-                            conf = box.conf[0]
-                            cls = int(box.cls[0])
-
-                            # Only show results with high confidence
-                            if conf > 0.5:  # Threshold for confidence
-                                # Draw rectangle for detected object
-                                cv2.rectangle(self.frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
-
-                                # Get object class name from YOLO
-                                class_name = self.model.names[cls]
-
-                                # Get price from the price dictionary
-                                if class_name.lower() in self.prices:
-                                    price_tag = self.prices[class_name.lower()]
-                                    # Add the object, increment count and calculate total for each type
-                                    self.detected_objects[class_name]['count'] += 1
-                                    self.detected_objects[class_name]['total'] = self.detected_objects[class_name][
-                                                                                     'count'] * price_tag
-                                else:
-                                    price_tag = "undefined value"  # Set to "undefined" if not in the price dictionary
-
-                                # Display class name and price tag on the video frame
-                                if price_tag != "undefined value":
-                                    cv2.putText(self.frame, f"{class_name}: ${price_tag}",
-                                                (x1, y1 - 10),
-                                                cv2.FONT_HERSHEY_SIMPLEX,
-                                                1,  # Larger font scale for price display
-                                                (0, 255, 0),
-                                                2)  # Thicker font for better readability
-                                else:
-                                    cv2.putText(self.frame, f"{class_name}: {price_tag}",
-                                                (x1, y1 - 10),
-                                                cv2.FONT_HERSHEY_SIMPLEX,
-                                                1,
-                                                (0, 0, 255),  # Red color for undefined prices
-                                                2)
-
-                    # Calculate the cumulative total price for all detected items, excluding undefined ones
-                    self.total_price = sum(item['total'] for item in self.detected_objects.values() if
-                                           isinstance(item['total'], (int, float)))
-
-                    # Calculate the cumulative total price for all detected items
-                    self.total_price = sum(item['total'] for item in self.detected_objects.values())
-
-                    # Draw buttons for "Scan", "Retry", and "Quit"
-                    self.draw_buttons(self.frame)
-
-                    # Display the frame with object detection
-                    cv2.imshow("Mobile Cam - Object Detection", self.frame)
-
-                self.frame_skip += 1
+            # Wait (briefly, so the window keeps handling keys) for a frame newer than the last one
+            frame = reader.wait(timeout=0.03)
+            self.expire_capture()
+            self.check_prices()
+            shown = 0
+            if frame is not None:
+                self.frame = frame
+                self.latency.count('frames')
+
+                if self.worker is not None:
+                    # Pick up whatever the worker process has finished since the last frame
+                    for job_id, boxes, confs, classes, elapsed in self.worker.poll():
+                        self.skip_controller.record(elapsed)
+                        self.latency.record('inference', elapsed)
+                        self.latency.count('inferences')
+                        started = self.latency.start()
+                        self.update_cart(boxes, confs, classes, self.worker_frames.pop(job_id, None))
+                        self.latency.stop('postprocess', started)
+
+                    # Hand it the new frame if it is free, at the same stride as inference_loop,
+                    # and the scene changed
+                    if not self.worker.busy() and reader.seq - last_seq >= self.inference_stride():
+                        last_seq = reader.seq
+                        if self.motion_gate.changed(self.frame):
+                            job_id = self.worker.submit(self.frame, imgsz=self.skip_controller.imgsz,
+                                                        classes=self.detect_classes())
+                            if job_id is not None:
+                                self.worker_frames[job_id] = self.frame
+
+                # Draw on a copy so self.frame stays a clean picture for Scan
+                started = self.latency.start()
+                display = self.frame.copy()
+
+                # Draw the latest detections on this frame, moved along with the
+                # picture since the frame they were found in
+                keyframe = self.keyframe
+                offsets = None
+                if self.follow_motion and keyframe[0] is not None and keyframe[0].shape == frame.shape:
+                    if keyframe is not self.box_flow.key:
+                        self.box_flow.reset(keyframe, keyframe[0], [box[:4] for box in keyframe[1]])
+                    offsets = self.box_flow.update(frame)
+                self.draw_detections(display, keyframe[1], offsets)
+
+                # Show how many model calls the motion gate has saved so far
+                cv2.putText(display, f"Inferences saved: {self.motion_gate.skipped}/{self.motion_gate.checked}",
+                            (30, display.shape[0] - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+                cv2.putText(display, self.skip_controller.status(),
+                            (30, display.shape[0] - 45), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+
+                # Draw buttons for "Scan", "Retry", and "Quit"
+                self.draw_buttons(display)
+
+                # Per-stage timings ('t' key), refreshed about once a second
+                if self.latency.enabled:
+                    for line, text in enumerate(self.latency.status()):
+                        cv2.putText(display, text, (30, 110 + 22 * line), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+                self.latency.stop('overlay', started)
+
+                # Display the frame with object detection
+                shown = self.latency.start()
+                cv2.imshow("Mobile Cam - Object Detection", display)
 
             # Capture keyboard input for 'c', 'e', and 'q'
             key = cv2.waitKey(1)
+            self.latency.stop('show', shown)  # imshow plus the waitKey that paints it
             if key == ord('c'):  # Scan (same as clicking "Scan")
                 self.capture_photo()
             elif key == ord('e'):  # Retry (same as clicking "Retry")
                 self.retry_action()
+            elif key == ord('u'):  # Toggle showing objects that have no price
+                self.show_unpriced = not self.show_unpriced
+                self.motion_gate.reset()  # Re-run the model so the change shows right away
+            elif key == ord('f'):  # Toggle moving the boxes with optical flow between inferences
+                self.follow_motion = not self.follow_motion
+            elif key == ord('t'):  # Toggle per-stage latency stats (starting from empty histograms)
+                self.latency.enabled = not self.latency.enabled
+                self.latency.reset()
+            elif key == ord('p'):  # Write the latency stats so far to a file
+                print(f"Latency stats written to {self.latency.dump()}")
             elif key == ord('q'):  # Quit (same as clicking "Quit")
                 self.quit_action()
                 break
 
-        cap.release()
         thread.join()
+        if inference_thread is not None:
+            inference_thread.join()
+        if self.checkout_thread is not None:
+            self.checkout_thread.join()
+        self.snapshots.close()  # Finish writing the photos still queued
+        cap.release()
+        if self.worker is not None:
+            self.worker.close()
+        print(f"Frames grabbed: {grabber.grabbed}, decoded: {grabber.decoded}")
+        print(f"Inferences saved by motion gate: {self.motion_gate.skipped} of {self.motion_gate.checked} frames")
+        stats = reader.stats()
+        print(f"Frames processed: {stats['received']}, dropped: {stats['dropped']}, stale waits: {stats['stale']}")
+        if self.latency.enabled:
+            print(f"Latency stats written to {self.latency.dump()}")
         cv2.destroyAllWindows()
 
-    def draw_buttons(self, frame):
-        # Draw "Scan" button
-        cv2.rectangle(frame, (30, 30), (150, 80), (200, 200, 200), -1)
-        cv2.putText(frame, "Scan", (50, 65), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
-
-        # Draw "Retry" button
-        cv2.rectangle(frame, (180, 30), (300, 80), (200, 200, 200), -1)
-        cv2.putText(frame, "Retry", (200, 65), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+    def inference_loop(self, reader):
+        # Runs the model on the newest frame at whatever rate it manages; frames that
+        # arrive while it is busy are simply skipped, the preview keeps the last result
+        last_seq = 0
+        while self.running:
+            frame = reader.wait(timeout=0.1)
+            if frame is None:
+                continue
+
+            if reader.seq - last_seq < self.inference_stride():
+                continue
+            last_seq = reader.seq
+
+            # Only run the model when the scene has changed since the last inference;
+            # otherwise the previous detections and cart carry forward
+            if self.motion_gate.changed(frame):
+                with self.detect_lock:
+                    self.detect_objects(frame)
+
+    def detect_objects(self, frame):
+        # Detect objects using YOLOv8 model, timing it so the skip controller can adapt
+        started = time.perf_counter()
+        results = self.model(frame, imgsz=self.skip_controller.imgsz, classes=self.detect_classes())
+        elapsed = time.perf_counter() - started
+        self.skip_controller.record(elapsed)
+        self.latency.record('inference', elapsed)
+        self.latency.count('inferences')
+
+        # Boxes as whole arrays; weak ones (0.25-0.5) are only used to keep existing tracks alive
+        started = self.latency.start()
+        boxes, confs, classes = box_arrays(results, conf_threshold=0.25)
+        self.update_cart(boxes, confs, classes, frame)
+        self.latency.stop('postprocess', started)
+
+    def scan_detect(self, frame):
+        # Detection for the frame that decides the bill: full resolution, larger input size.
+        # Returns (boxes, confs, classes), or None when the inference worker couldn't run it
+        if self.scan_model is not None:
+            results = self.scan_model(frame, imgsz=self.scan_imgsz, classes=self.detect_classes())
+            return box_arrays(results, conf_threshold=0.25)
+
+        # Worker process: let it finish the preview frame it is on, then send the scan frame.
+        # This runs on the UI thread, so give up (returning None) if the worker died or stalls
+        deadline = time.monotonic() + self.scan_timeout
+        while self.worker.busy():
+            for job_id, boxes, confs, classes, _ in self.worker.poll():
+                self.update_cart(boxes, confs, classes, self.worker_frames.pop(job_id, None))
+            if not self.worker_alive(deadline):
+                return None
+            time.sleep(0.005)
+        submitted = frame
+        job_id = self.worker.submit(frame, imgsz=self.scan_imgsz, classes=self.detect_classes())
+        if job_id is None:
+            # A full-resolution frame doesn't fit the worker's frame slots, use the preview frame
+            submitted = self.frame
+            job_id = self.worker.submit(self.frame, imgsz=self.scan_imgsz, classes=self.detect_classes())
+        if job_id is None:
+            print("Scan failed: the inference worker didn't take the frame")
+            return None
+        while True:
+            for finished_id, boxes, confs, classes, _ in self.worker.poll():
+                self.worker_frames.pop(finished_id, None)
+                if finished_id == job_id:
+                    # Boxes in frame's coordinates, whichever picture the worker got
+                    return (boxes * (frame.shape[1] / submitted.shape[1])).astype(int), confs, classes
+            if not self.worker_alive(deadline):
+                return None
+            time.sleep(0.005)
+
+    def worker_alive(self, deadline):
+        # For scan_detect's waits: False (with a message) once the worker is gone or too slow
+        if not self.worker.process.is_alive():
+            print(f"Scan failed: the inference worker exited with code {self.worker.process.exitcode}")
+            return False
+        if time.monotonic() > deadline:
+            print(f"Scan failed: no result from the inference worker within {self.scan_timeout} s")
+            return False
+        return True
+
+    def use_prices(self):
+        # Switch to the catalog's current prices as arrays indexed by class id.
+        # Class ids the model should look for: only the ones we have a price for, so other
+        # objects (people, chairs, phones...) are dropped inside NMS and never reach Python
+        self.price_table = self.catalog.table
+        self.priced_classes = np.flatnonzero(self.price_table.priced).tolist()
+        self.cart.reprice(self.price_table.cents)
+
+    def check_prices(self):
+        # Called from the display loop: pick up an edited price file without a restart
+        if self.catalog.poll():
+            with self.detect_lock:  # Not in the middle of a cart update
+                self.use_prices()
+            self.motion_gate.reset()  # Re-run the model so the cart is re-priced right away
+            print(f"Prices reloaded from {self.catalog.path}")
+        if self.promotions.poll():
+            with self.detect_lock:
+                self.cart.set_rules(self.promotions.rules)
+            print(f"Promotions reloaded from {self.promotions.path}: {len(self.promotions.rules)} rules")
+
+    def inference_stride(self):
+        # Camera frames between preview inferences: every Nth as picked by the skip
+        # controller, half as often while the same items sit still on the counter
+        return self.skip_controller.stride * (2 if self.tracker.stable else 1)
+
+    def detect_classes(self):
+        # Class filter for the model: only priced classes unless the debug toggle is on
+        return None if self.show_unpriced else self.priced_classes
+
+    def update_cart(self, boxes, confs, classes, frame=None):
+        # Follow each object across frames so it is counted once and doesn't flicker
+        # in and out of the cart when its confidence wobbles around 0.5
+        self.tracker.update(boxes, confs, classes)
+        tracks = self.tracker.confirmed()
+        self.set_cart(np.array([track.cls for track in tracks], dtype=int))
+
+        # Keep the boxes so they can be drawn on the following frames too
+        # (frame: the picture they were found in, for following them with optical flow)
+        self.detections = [[*map(int, track.box), track.cls] for track in tracks]
+        self.keyframe = (frame, self.detections)
+
+    def apply_scan(self, boxes, confs, classes, scale=1):
+        # Bill the scan together with the tracker rather than from one frame on its own: its
+        # detections update the tracks like any inference, so an item the tracker has
+        # confirmed still counts if the scan frame missed it, and no item is counted twice.
+        # Items the scan sees confidently for the first time (e.g. too small for the preview)
+        # count as well. scale: scan frame coordinates -> preview (tracker) coordinates
+        self.tracker.update(boxes * scale, confs, classes)
+        tracks = self.tracker.seen()
+        self.set_cart(np.array([track.cls for track in tracks], dtype=int))
+        self.detections = [[*map(int, track.box), track.cls] for track in tracks]
+        self.keyframe = (None, self.detections)
+
+    def set_cart(self, classes):
+        # Count every priced class at once; the cart only re-prices the classes whose count changed
+        self.cart.set_counts(count_classes(classes, self.price_table))
+
+    def draw_detections(self, frame, detections=None, offsets=None):
+        # offsets: per-box (dx, dy) from BoxFlow to line older boxes up with this frame
+        if detections is None:
+            detections = self.detections
+        for index, (x1, y1, x2, y2, cls) in enumerate(detections):
+            if offsets is not None and index < len(offsets):
+                dx, dy = (int(round(value)) for value in offsets[index])
+                x1, y1, x2, y2 = x1 + dx, y1 + dy, x2 + dx, y2 + dy
+
+            # Draw rectangle for detected object
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
+
+            # Display class name and price tag on the video frame,
+            # in red when the class has no price
+            cv2.putText(frame, self.price_table.labels[cls], (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX,
+                        1,  # Larger font scale for price display
+                        (0, 255, 0) if self.price_table.priced[cls] else (0, 0, 255),
+                        2)  # Thicker font for better readability
 
-        # Draw "Quit" button
-        cv2.rectangle(frame, (330, 30), (450, 80), (200, 200, 200), -1)
-        cv2.putText(frame, "Quit", (350, 65), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+    def draw_buttons(self, frame):
+        # Draw "Scan", "Retry" and "Quit" buttons: rendered once, then copied onto each frame
+        for label, corner in BUTTONS:
+            self.overlay.blit(frame, self.overlay.sprite(('button', label), lambda: render_button(label)), corner)
 
-    def capture_photo(self):
+    def capture_photo(self, scan_result=None):
         # Save the current frame as an image
+        # scan_result: (boxes, confs, classes) for self.frame when the scan already ran elsewhere
         if self.frame is not None:
-            photo_name = f"detected_photo_{self.photo_count}.jpg"
-            cv2.imwrite(photo_name, self.frame)
-            print(f"Photo saved: {photo_name}")
-
-            # Show the captured photo in a new window
-            captured_image = cv2.imread(photo_name)
-            if captured_image is not None:
-                cv2.imshow("Captured Photo", captured_image)
-                self.display_price_window()  # Show the price window after capturing the photo
-
-                cv2.waitKey(1000)  # Optional: Wait 1 second before closing the window
-                cv2.destroyWindow("Captured Photo")  # Close the captured photo window
-            else:
-                print("Error: Could not load the captured photo.")
+            scanned = time.perf_counter()  # For measuring how long until the checkout shows
+            started = self.latency.start()
+            # Re-run detection on the full-resolution frame so the bill comes from the
+            # best picture we have, not from the small preview inference
+            frame = self.grabber.full_frame() if self.grabber is not None and scan_result is None else None
+            if frame is None:
+                frame = self.frame
+            # Hold the model (and the cart) only while the scan runs; the checkout
+            # gets its own copy of the cart, so preview detection can go on during payment
+            with self.detect_lock:
+                scan_result = scan_result or self.scan_detect(frame)
+                if scan_result is None:
+                    return  # The worker couldn't run the scan; nothing is billed or saved
+                scale = self.frame.shape[1] / frame.shape[1]  # The full-resolution frame may be larger
+                self.apply_scan(*scan_result, scale)
+                captured = frame.copy()
+                self.draw_detections(captured, [[*(int(value / scale) for value in box[:4]), box[4]]
+                                                for box in self.detections])
+                cart = self.cart_snapshot()
+                cart['scanned'] = scanned
+
+            self.snapshots.record(captured, self.lane, cart['items'], cart['total'])
+            print(f"Saving photo {self.photo_count} to {self.snapshots.root}")
+
+            # Show the captured photo in a new window, straight from memory
+            cv2.imshow("Captured Photo", captured)
+            self.open_checkout(cart)  # Show the price window after capturing the photo
+            self.capture_until = time.perf_counter() + 1  # Close the photo after 1 second
             self.photo_count += 1
+            self.latency.stop('capture_photo', started)
+            self.latency.count('scans')
 
-    def retry_action(self):
-        # Close both the price window and the captured photo window
-        if hasattr(self, 'tk_window') and self.tk_window.winfo_exists():
-            self.tk_window.destroy()
-        if cv2.getWindowProperty("Captured Photo", cv2.WND_PROP_VISIBLE) >= 1:
+    def expire_capture(self):
+        # Called from the OpenCV loop: close the captured photo window once its time is up
+        if self.capture_until is not None and time.perf_counter() > self.capture_until:
+            self.capture_until = None
             cv2.destroyWindow("Captured Photo")
+
+    def cart_snapshot(self):
+        # Frozen copy of the bill for the checkout thread; the live cart keeps changing behind it.
+        # items: (name, unit price, quantity, line total) rows, money in cents;
+        # total: what is due after promotions
+        snapshot = self.cart.snapshot()
+        return {'snapshot': snapshot, 'items': snapshot.lines(self.names), 'total': snapshot.due_cents}
+
+    def open_checkout(self, cart):
+        # Queue the cart for the checkout thread, starting the thread on the first scan.
+        # A scan made while a customer is still paying is shown once that screen closes.
+        if self.checkout_thread is None or not self.checkout_thread.is_alive():
+            self.checkout_thread = threading.Thread(target=self.checkout_loop, daemon=True)
+            self.checkout_thread.start()
+        self.checkout_carts.put(cart)
+
+    def checkout_loop(self):
+        # Checkout thread: every Tk call happens here. The root and the checkout screen
+        # are built once and then only shown, refreshed and hidden for each scan.
+        try:
+            self.build_price_window()
+            self.tk_window.after(20, self.poll_checkout)
+            self.tk_window.mainloop()
+        finally:
+            self.release_tk()
+        if self.checkout_times:
+            times = sorted(self.checkout_times)
+            print(f"Scan to checkout screen: median {times[len(times) // 2]:.0f} ms, "
+                  f"worst {times[-1]:.0f} ms over {len(times)} scans")
+
+    def release_tk(self):
+        # Drop every Tk object while still on the thread that created the interpreter.
+        # Left on self, they would be freed from the main thread at exit, which aborts
+        # with "Tcl_AsyncDelete: async handler deleted by the wrong thread".
+        self.checkout_popups = []
+        self.item_list = None
+        self.total_price_label = None
+        self.qr_code_image = None
+        self.cash_image = None
+        self.buymeacoffee_image = None
+        self.assets.forget_photos()
+        self.tk_window = None
+        self.checkout_shown = None  # A new screen starts with no rows
+        self.checkout_cart = None
+        gc.collect()  # Widgets and their root refer to each other: collect the cycles here too
+
+    def poll_checkout(self):
+        # Runs inside the checkout mainloop: carry out requests from the OpenCV thread
+        if not self.running:
+            self.tk_window.destroy()
+            return
+        while True:
+            try:
+                command = self.checkout_commands.get_nowait()
+            except queue.Empty:
+                break
+            if command == 'close':
+                self.hide_price_window()
+
+        if self.checkout_cart is None:
+            try:
+                self.display_price_window(self.checkout_carts.get_nowait())
+            except queue.Empty:
+                pass
+        self.tk_window.after(20, self.poll_checkout)
+
+    def retry_action(self):
+        # Close both the price window and the captured photo window. Called from the
+        # OpenCV loop or from the checkout thread, so neither window is touched directly:
+        # the checkout thread hides its screen, the OpenCV loop closes the photo
+        self.checkout_commands.put('close')
+        if self.capture_until is not None:
+            self.capture_until = 0
         self.show_price_window = False  # Reset flag
 
     def quit_action(self):
-        self.running = False  # Stop the camera feed
-        if hasattr(self, 'tk_window') and self.tk_window.winfo_exists():
-            self.tk_window.destroy()
+        self.running = False  # Stop the camera feed (the checkout window closes itself)
         if cv2.getWindowProperty("Captured Photo", cv2.WND_PROP_VISIBLE) >= 1:
             cv2.destroyWindow("Captured Photo")
         cv2.destroyAllWindows()  # Close all OpenCV windows
 
     def load_qr_code_image(self):
-        try:
-            img = Image.open("qrcode.jpg")  # Adjust the path if necessary
-            img = img.resize((250, 200), Image.Resampling.LANCZOS)  # Resize the image to fit the frame
-            self.qr_code_image = ImageTk.PhotoImage(img)
-            self.original_qr_image = img  # Store the original image
-        except Exception as e:
-            print(f"Error loading QR code image: {e}")
+        self.qr_code_image = self.assets.photo('qr')  # Decoded and resized once, at startup
 
     def load_cash_image(self):
-        try:
-            img = Image.open("cash.jpg")  # Adjust the path if necessary
-            img = img.resize((250, 200), Image.Resampling.LANCZOS)  # Resize the image to fit the frame
-            self.cash_image = ImageTk.PhotoImage(img)
-            self.original_cash_image = img  # Store the original image
-        except Exception as e:
-            print(f"Error loading cash image: {e}")
+        self.cash_image = self.assets.photo('cash')
 
     def load_buymeacoffee_image(self):
-        try:
-            img = Image.open("buymeacoffee.jpg")
-            img = img.resize((400, 400), Image.Resampling.LANCZOS)
-            self.buymeacoffee_image = ImageTk.PhotoImage(img)
-        except Exception as e:
-            print(f"Error loading buymeacoffee image: {e}")
+        self.buymeacoffee_image = self.assets.photo('buymeacoffee')
 
     def darken_qr_image(self):
-        enhancer = ImageEnhance.Brightness(self.original_qr_image)
-        darkened_img = enhancer.enhance(0.5)  # Darken the image
-        self.qr_code_image = ImageTk.PhotoImage(darkened_img)
+        # Hover versions are precomputed too, so hovering costs nothing
+        self.qr_code_image = self.assets.photo('qr', dark=True)
         return self.qr_code_image
 
     def restore_qr_image(self):
-        self.qr_code_image = ImageTk.PhotoImage(self.original_qr_image)
+        self.qr_code_image = self.assets.photo('qr')
         return self.qr_code_image
 
     def darken_cash_image(self):
-        enhancer = ImageEnhance.Brightness(self.original_cash_image)
-        darkened_img = enhancer.enhance(0.5)  # Darken the image
-        self.cash_image = ImageTk.PhotoImage(darkened_img)
+        self.cash_image = self.assets.photo('cash', dark=True)
         return self.cash_image
 
     def restore_cash_image(self):
-        self.cash_image = ImageTk.PhotoImage(self.original_cash_image)
+        self.cash_image = self.assets.photo('cash')
         return self.cash_image
 
-    def display_price_window(self):
+    def build_price_window(self):
+        # Build the checkout screen once, hidden; display_price_window only fills it in
         self.tk_window = tk.Tk()
+        self.tk_window.withdraw()
         self.tk_window.title("Cashier Checkout")
         self.tk_window.attributes("-fullscreen", True)
         self.tk_window.configure(bg="#F8F9F0")  # Light gray background
+        self.tk_window.protocol("WM_DELETE_WINDOW", self.hide_price_window)
 
         title_label = tk.Label(self.tk_window, text="Cashier Checkout", font=("Helvetica", 40, "bold"), bg="#F8F9F0", fg="#333333")
         title_label.pack(pady=20)
@@ -280,33 +604,26 @@ class MobileCamera:
         self.load_cash_image()
 
         columns = ("Item", "Price", "Quantity", "Total")
-        item_list = ttk.Treeview(frame, columns=columns, show='headings', height=10)
+        self.item_list = ttk.Treeview(frame, columns=columns, show='headings', height=10)
 
-        item_list.heading("Item", text="Item")
-        item_list.heading("Price", text="Price ($)")
-        item_list.heading("Quantity", text="Quantity")
-        item_list.heading("Total", text="Total ($)")
+        self.item_list.heading("Item", text="Item")
+        self.item_list.heading("Price", text="Price ($)")
+        self.item_list.heading("Quantity", text="Quantity")
+        self.item_list.heading("Total", text="Total ($)")
 
-        item_list.column("Item", width=300, anchor="center")
-        item_list.column("Price", width=200, anchor="center")
-        item_list.column("Quantity", width=200, anchor="center")
-        item_list.column("Total", width=200, anchor="center")
+        self.item_list.column("Item", width=300, anchor="center")
+        self.item_list.column("Price", width=200, anchor="center")
+        self.item_list.column("Quantity", width=200, anchor="center")
+        self.item_list.column("Total", width=200, anchor="center")
 
         style = ttk.Style()
         style.configure("Treeview", font=("Helvetica", 18), rowheight=40)
         style.configure("Treeview.Heading", font=("Helvetica", 24, "bold"))
 
-        for item_name, data in self.detected_objects.items():
-            price = self.prices.get(item_name.lower(), 0)
-            count = data['count']
-            total_for_item = data['total']
-            item_list.insert("", "end", values=(item_name.capitalize(), f"{price:.2f}", count, f"{total_for_item:.2f}"))
-
-        item_list.pack(fill="both", expand=True)
+        self.item_list.pack(fill="both", expand=True)
 
-        total_price_text = f"Total Price: ${self.total_price:.2f}"
-        total_price_label = tk.Label(frame, text=total_price_text, font=("Helvetica", 28, "bold"), bg="#FFFFFF", fg="#D9534F")
-        total_price_label.pack(pady=20)
+        self.total_price_label = tk.Label(frame, text="", font=("Helvetica", 28, "bold"), bg="#FFFFFF", fg="#D9534F")
+        self.total_price_label.pack(pady=20)
 
         button_frame = tk.Frame(self.tk_window, bg="#F8F9F0")
         button_frame.pack(pady=20)
@@ -323,14 +640,76 @@ class MobileCamera:
         style.configure("Accent.TButton", font=("Helvetica", 18, "bold"), padding=10)
         style.map("Accent.TButton", foreground=[('active', '#FFFFFF')], background=[('active', '#D9534F')])
 
-        self.tk_window.mainloop()
+    def display_price_window(self, cart):
+        # cart: snapshot from cart_snapshot(). Only the rows whose quantity or price
+        # differs from the previous customer's bill are touched, then the prebuilt screen is shown.
+        started = self.latency.start()
+        self.checkout_cart = cart
+        self.assets.refresh()  # Picks up a replaced image file (only files whose mtime changed)
+        snapshot = cart['snapshot']
+        changed = snapshot.changed(self.checkout_shown)
+
+        # Rows are kept in class id order: drop the emptied ones first, then each
+        # remaining change lands at its final position
+        for cls in changed:
+            if snapshot.line(cls)[0] == 0:
+                self.item_list.delete(str(cls))
+        for cls in changed:
+            count, unit_cents = snapshot.line(cls)
+            if count == 0:
+                continue
+            values = (self.names[cls].capitalize(), format_cents(unit_cents), count, format_cents(unit_cents * count))
+            if self.item_list.exists(str(cls)):
+                self.item_list.item(str(cls), values=values)
+            else:
+                index = int(np.searchsorted(snapshot.classes, cls))
+                self.item_list.insert("", index, iid=str(cls), values=values)
+
+        # Deals go below the items, one row per promotion in effect, as a negative total
+        deals_changed = snapshot.deals_changed(self.checkout_shown)
+        for index in deals_changed:
+            if snapshot.deal(index) is None:
+                self.item_list.delete(f"deal{index}")
+        applied = [deal[0] for deal in snapshot.deals]
+        for index in deals_changed:
+            if snapshot.deal(index) is None:
+                continue
+            name, times, saving = snapshot.deal(index)
+            values = (name, "", times, f"-{format_cents(saving)}")
+            if self.item_list.exists(f"deal{index}"):
+                self.item_list.item(f"deal{index}", values=values)
+            else:
+                self.item_list.insert("", len(snapshot.classes) + applied.index(index), iid=f"deal{index}", values=values)
+        self.checkout_shown = snapshot
+
+        total_text = f"Total Price: ${format_cents(cart['total'])}"
+        if snapshot.discount_cents:
+            total_text += f"  (you save ${format_cents(snapshot.discount_cents)})"
+        self.total_price_label.config(text=total_text)
+
+        self.tk_window.deiconify()
+        self.tk_window.lift()
+        self.tk_window.update_idletasks()
+        self.latency.stop('checkout', started)
+        if 'scanned' in cart:
+            self.checkout_times.append((time.perf_counter() - cart['scanned']) * 1000)
+
+    def hide_price_window(self):
+        # Hide the checkout screen (and any payment windows) until the next scan
+        for popup in self.checkout_popups:
+            if popup.winfo_exists():
+                popup.destroy()
+        self.checkout_popups = []
+        self.tk_window.withdraw()
+        self.checkout_cart = None
 
     def checkout_action(self):
         checkout_window = tk.Toplevel(self.tk_window)
+        self.checkout_popups.append(checkout_window)
         checkout_window.title("Checkout Confirmation")
         checkout_window.geometry("600x500")
 
-        price_label = tk.Label(checkout_window, text=f"Total Price: ${self.total_price:.2f}", font=("Helvetica", 30, "bold"), fg="#D9534F")
+        price_label = tk.Label(checkout_window, text=f"Total Price: ${format_cents(self.checkout_cart['total'])}", font=("Helvetica", 30, "bold"), fg="#D9534F")
         price_label.pack(pady=20)
 
         paymentmethod_label = tk.Label(checkout_window, text=f'Select Payment Method', font=("Helvetica", 30, "bold"))
@@ -382,6 +761,7 @@ class MobileCamera:
 
         # Create a new window on click
         new_window = tk.Toplevel(self.tk_window)
+        self.checkout_popups.append(new_window)
         new_window.title("QrCode")
         new_window.geometry("600x600")  # Increased window size
 
@@ -401,6 +781,7 @@ class MobileCamera:
     def cash_clicked(self, event):
         # Create a new window on click
         new_window = tk.Toplevel(self.tk_window)
+        self.checkout_popups.append(new_window)
         new_window.title("Cashout")
         new_window.geometry("500x300")
 
@@ -410,21 +791,16 @@ class MobileCamera:
         close_button = ttk.Button(new_window, text="Close", command=new_window.destroy)
         close_button.pack(pady=20)
 
-    def retry_action(self):
-        if hasattr(self, 'tk_window') and self.tk_window.winfo_exists():
-            self.tk_window.destroy()
-
     def close_cashier_checkout(self):
-        if hasattr(self, 'tk_window') and self.tk_window.winfo_exists():
-            self.tk_window.destroy()
-
-
-        self.tk_window.mainloop()
+        # Safe from either thread: the checkout thread hides its own screen
+        self.checkout_commands.put('close')
 
 
 # Initialize and run the camera object
-cam = MobileCamera()
-cam.getVideo("http://192.168.1.137:8080/video") #The number could be change depends on the network
+# (guarded so the inference worker process can import this file without starting a camera)
+if __name__ == "__main__":
+    cam = MobileCamera()
+    cam.getVideo("http://192.168.1.137:8080/video") #The number could be change depends on the network
 
 
 
@@ -0,0 +1,54 @@
+import numpy as np
+
+from cart import to_cents
+
+
+class PriceTable:
+    # The price dictionary turned into arrays indexed by model class id, so a whole
+    # frame of detections can be priced with NumPy instead of one dict lookup per box.
+    # default: price for classes missing from the dictionary (they stay unpriced if None)
+    def __init__(self, names, prices, default=None):
+        self.names = names  # Model class id -> class name
+        dtype = np.array(list(prices.values()) + [default or 0]).dtype  # Keep whole-dollar prices as ints
+        self.prices = np.zeros(len(names), dtype=dtype)  # Price per class id, 0 when unpriced
+        self.priced = np.zeros(len(names), dtype=bool)  # True for classes that have a price
+        self.labels = []  # Text drawn next to each box, per class id
+
+        for cls in range(len(names)):
+            class_name = names[cls]
+            if class_name.lower() in prices:
+                self.prices[cls] = prices[class_name.lower()]
+                self.priced[cls] = True
+                self.labels.append(f"{class_name}: ${prices[class_name.lower()]}")
+            elif default is not None:
+                self.prices[cls] = default
+                self.priced[cls] = True
+                self.labels.append(f"{class_name}: ${default}")
+            else:
+                self.labels.append(f"{class_name}: undefined value")
+        self.cents = to_cents(self.prices)  # The same prices in exact integer cents, for billing
+
+
+def box_arrays(results, conf_threshold=0.5):
+    # Pull the boxes above the confidence threshold out of the YOLO results in one go:
+    # (N, 4) integer xyxy corners, (N,) confidences and (N,) integer class ids
+    all_boxes = []
+    all_confs = []
+    all_classes = []
+    for result in results:
+        boxes = result.boxes
+        confs = boxes.conf.cpu().numpy()
+        keep = confs > conf_threshold
+        all_boxes.append(boxes.xyxy.cpu().numpy()[keep].astype(int))
+        all_confs.append(confs[keep])
+        all_classes.append(boxes.cls.cpu().numpy()[keep].astype(int))
+
+    if not all_boxes:
+        return np.zeros((0, 4), dtype=int), np.zeros(0), np.zeros(0, dtype=int)
+    return np.concatenate(all_boxes), np.concatenate(all_confs), np.concatenate(all_classes)
+
+
+def count_classes(classes, price_table):
+    # Number of priced objects per class id, in one bincount
+    priced = classes[price_table.priced[classes]]
+    return np.bincount(priced, minlength=len(price_table.prices))
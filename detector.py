@@ -0,0 +1,127 @@
+import glob
+import os
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+# Export formats for the CPU runtimes, and the file/folder ultralytics writes next to the weights
+BACKENDS = {
+    'onnx': ('onnx', '{stem}.onnx'),  # ONNX Runtime
+    'openvino': ('openvino', '{stem}_openvino_model'),  # OpenVINO IR
+}
+
+
+def exported_path(weights, backend):
+    stem, _ = os.path.splitext(weights)
+    return BACKENDS[backend][1].format(stem=stem)
+
+
+def export_model(weights, backend):
+    # Export the PyTorch weights once and reuse the result on later starts.
+    # The export is redone when the .pt file is newer than the cached copy.
+    path = exported_path(weights, backend)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(weights):
+        return path
+
+    print(f"Exporting {weights} for {backend}, this only happens once")
+    # dynamic=True so the skip controller can still change imgsz at runtime
+    return YOLO(weights).export(format=BACKENDS[backend][0], dynamic=True)
+
+
+# Fixed sample checkout photos kept in the repo (detected_photo_*.jpg), used to calibrate
+# the INT8 model. Scans from detectcashier, multilane, obj7 and obj8tinker go to snapshots/
+# instead; the older getface4/getface5/getobject6 scripts still save detected_photo_N.jpg
+# into the working directory, so don't run them from here. int8report.py evaluates on
+# these same photos, so its agreement numbers are optimistic.
+CALIBRATION_PHOTOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'detected_photo_*.jpg')
+
+# Written by int8report.py. Until it exists the INT8 backend is unvalidated: no one has
+# compared its detections with the FP32 model on this machine and these photos.
+INT8_REPORT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'int8_report.txt')
+
+
+def letterbox(image, size=640):
+    # Same preprocessing ultralytics applies before inference: keep the aspect ratio,
+    # pad to a square with grey, BGR -> RGB, HWC -> NCHW, scale to 0-1
+    height, width = image.shape[:2]
+    scale = min(size / height, size / width)
+    resized = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_LINEAR)
+    padded = np.full((size, size, 3), 114, dtype=np.uint8)
+    top = (size - resized.shape[0]) // 2
+    left = (size - resized.shape[1]) // 2
+    padded[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    return np.ascontiguousarray(padded[:, :, ::-1].transpose(2, 0, 1)[None], dtype=np.float32) / 255.0
+
+
+def quantize_model(weights, photos=CALIBRATION_PHOTOS, size=640):
+    # Build a statically quantized INT8 copy of the ONNX export, calibrated on the
+    # activation ranges seen on real checkout photos. Cached like the other exports.
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    fp32_path = export_model(weights, 'onnx')
+    int8_path = f"{os.path.splitext(weights)[0]}_int8.onnx"
+    if os.path.exists(int8_path) and os.path.getmtime(int8_path) >= os.path.getmtime(fp32_path):
+        return int8_path
+
+    paths = sorted(glob.glob(photos))
+    if not paths:
+        raise FileNotFoundError(f"No calibration photos found matching {photos}")
+
+    fp32_model = onnx.load(fp32_path)
+    input_name = fp32_model.graph.input[0].name
+
+    class PhotoReader(CalibrationDataReader):
+        def __init__(self):
+            self.images = iter(paths)
+
+        def get_next(self):
+            for path in self.images:
+                image = cv2.imread(path)
+                if image is not None:
+                    return {input_name: letterbox(image, size)}
+            return None
+
+    # Keep the detection head (the last /model.N/ block) in float: the box decoding
+    # and class scores there lose the most accuracy when quantized
+    head = max(int(node.name.split('/')[1].split('.')[1]) for node in fp32_model.graph.node
+               if node.name.startswith('/model.'))
+    head_nodes = [node.name for node in fp32_model.graph.node if node.name.startswith(f'/model.{head}/')]
+
+    print(f"Quantizing {fp32_path} to INT8 using {len(paths)} calibration photos")
+    quantize_static(fp32_path, int8_path, PhotoReader(), quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, nodes_to_exclude=head_nodes)
+
+    # ultralytics reads the class names, stride and imgsz from the model metadata
+    int8_model = onnx.load(int8_path)
+    if not int8_model.metadata_props:
+        int8_model.metadata_props.extend(fp32_model.metadata_props)
+        onnx.save(int8_model, int8_path)
+    return int8_path
+
+
+def load_model(weights='yolov8n.pt', backend='torch', warmup_size=640, allow_unvalidated=False):
+    # Load the detector for the given backend: 'torch' (PyTorch eager, the old behaviour),
+    # 'onnx', 'openvino' or 'onnx-int8' (quantized, see quantize_model). 'onnx-int8' is
+    # refused until int8report.py has produced int8_report.txt, unless allow_unvalidated
+    # is set (int8report.py itself needs that to compare it). Every backend is
+    # driven through the same YOLO object, so the results keep the result.boxes.xyxy /
+    # .conf / .cls layout the camera loop reads.
+    if backend == 'torch':
+        model = YOLO(weights)
+    elif backend == 'onnx-int8':
+        if not os.path.exists(INT8_REPORT) and not allow_unvalidated:
+            raise FileNotFoundError(f"The INT8 model is unvalidated: no {INT8_REPORT}. Run python int8report.py "
+                                    "and check the report before using 'onnx-int8' at a checkout.")
+        model = YOLO(quantize_model(weights), task='detect')
+    elif backend in BACKENDS:
+        model = YOLO(export_model(weights, backend), task='detect')
+    else:
+        raise ValueError(f"Unknown backend: {backend}")
+
+    if warmup_size:
+        # Run one blank frame through so the first camera frame doesn't pay for
+        # runtime initialisation and memory allocation
+        model(np.zeros((warmup_size, warmup_size, 3), dtype=np.uint8), imgsz=warmup_size, verbose=False)
+    return model
@@ -0,0 +1,147 @@
+import threading
+
+import cv2
+
+
+class FrameExchange:
+    # Hands the newest camera frame from the grabber thread to the detection loop.
+    # Every published frame gets a sequence number so a reader can tell a new frame
+    # from one it has already processed, instead of spinning on a shared slot.
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.frame = None
+        self.seq = 0  # Sequence number of the newest frame (0 = nothing published yet)
+        self.closed = False
+        self.readers = []
+
+    def publish(self, frame):
+        # Called by the grabber: replace the slot and wake every waiting reader
+        with self.condition:
+            self.frame = frame
+            self.seq += 1
+            self.condition.notify_all()
+
+    def close(self):
+        # Wake up readers so they can notice the camera is gone
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def reader(self):
+        reader = FrameReader(self)
+        self.readers.append(reader)
+        return reader
+
+    def wanted(self):
+        # A new frame is only worth decoding once some reader has caught up with the last one
+        with self.condition:
+            return not self.readers or any(reader.seq == self.seq for reader in self.readers)
+
+
+class FrameReader:
+    # One consumer's view of a FrameExchange. Keeps its own last seen sequence
+    # number and counts how many frames it never got to see (dropped) and how
+    # often it asked for a frame before a newer one existed (stale).
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self.seq = 0  # Sequence number of the last frame this reader returned
+        self.received = 0  # Frames handed to this reader
+        self.dropped = 0  # Frames published but replaced before this reader took them
+        self.stale = 0  # Times the reader found no newer frame and had to wait
+
+    def wait(self, timeout=None):
+        # Block until a frame newer than the last one returned is available.
+        # Returns None on timeout or when the exchange is closed.
+        exchange = self.exchange
+        with exchange.condition:
+            if exchange.seq == self.seq and not exchange.closed:
+                self.stale += 1
+                exchange.condition.wait_for(lambda: exchange.seq != self.seq or exchange.closed, timeout)
+
+            if exchange.seq == self.seq:
+                return None
+
+            if self.seq:
+                self.dropped += exchange.seq - self.seq - 1
+            self.seq = exchange.seq
+            self.received += 1
+            return exchange.frame
+
+    def stats(self):
+        return {'received': self.received, 'dropped': self.dropped, 'stale': self.stale}
+
+
+# cv2.imdecode flags for decoding a JPEG straight to 1/2, 1/4 or 1/8 of its size
+REDUCED_DECODE_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+class FrameGrabber:
+    # Reads the camera with grab() for every frame so the stream never backs up,
+    # but only decodes (retrieve()) a frame when a reader is ready to take it and
+    # it falls on the decode stride. Everything else is dropped still compressed.
+    def __init__(self, cap, exchange, decode_stride=1, decode_scale=1, stats=None):
+        self.cap = cap
+        self.exchange = exchange
+        self.decode_stride = max(1, decode_stride)  # Decode at most every Nth grabbed frame
+        self.decode_scale = decode_scale  # 1 = full size, 2/4/8 = reduced-size JPEG decode
+        self.grabbed = 0  # Frames pulled off the stream
+        self.decoded = 0  # Frames actually decoded and published
+        self.raw_jpeg = False
+        self.packet = None  # Undecoded JPEG of the last published frame (raw mode only)
+        self.stats = stats  # LatencyStats for the 'capture' and 'decode' stages (see latency.py)
+
+        if decode_scale in REDUCED_DECODE_FLAGS:
+            # In raw mode the FFmpeg backend hands back the undecoded MJPEG packet,
+            # which cv2.imdecode can decode directly at the reduced size
+            self.raw_jpeg = cap.set(cv2.CAP_PROP_FORMAT, -1)
+            if not self.raw_jpeg:
+                print("Raw MJPEG capture not supported, decoding full size and scaling down instead")
+
+    def decode(self):
+        ret, data = self.cap.retrieve()
+        if not ret:
+            return None
+
+        if self.raw_jpeg:
+            self.packet = data.reshape(-1).copy()
+            return cv2.imdecode(self.packet, REDUCED_DECODE_FLAGS[self.decode_scale])
+
+        if self.decode_scale > 1:
+            height, width = data.shape[:2]
+            size = (width // self.decode_scale, height // self.decode_scale)
+            return cv2.resize(data, size, interpolation=cv2.INTER_AREA)
+        return data
+
+    def full_frame(self):
+        # Full-resolution decode of the last published frame, when frames are decoded at
+        # reduced size; None when that isn't available (the published frame is already full size)
+        packet = self.packet
+        return cv2.imdecode(packet, cv2.IMREAD_COLOR) if packet is not None else None
+
+    def run(self, is_running):
+        stats = self.stats
+        while is_running():
+            started = stats.start() if stats is not None else 0
+            if not self.cap.grab():
+                continue
+            self.grabbed += 1
+            if started:
+                stats.stop('capture', started)  # Includes waiting for the camera's next frame
+
+            # Skip the decode for frames off the stride or that no reader is waiting for
+            if self.grabbed % self.decode_stride or not self.exchange.wanted():
+                continue
+
+            started = stats.start() if stats is not None else 0
+            frame = self.decode()
+            if started:
+                stats.stop('decode', started)
+            if frame is not None:
+                self.decoded += 1
+                self.exchange.publish(frame)
+
+        self.exchange.close()
@@ -1,6 +1,9 @@
 import cv2
 import threading
+import time
 import numpy as np
+from framebuffer import FrameExchange, FrameGrabber
+from skipcontroller import FrameSkipController
 
 class MobileCamera:
     def __init__(self):
@@ -8,7 +11,8 @@ class MobileCamera:
         self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
         self.frame = None
         self.running = True
-        self.frame_skip = 0  # Initialize frame skip
+        self.decode_scale = 1  # 1 = full size, 2 or 4 = decode camera JPEGs at 1/2 or 1/4 size
+        self.skip_controller = FrameSkipController(sizes=())  # Picks the detection stride from measured latency
         self.photo_count = 0  # To count the saved photos
         self.price = 10  # Example price for each detected face (numerical value)
         self.total_price = 0  # To accumulate the total price
@@ -23,44 +27,53 @@ class MobileCamera:
         cap.set(cv2.CAP_PROP_FRAME_WIDTH, 960)
         cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
 
-        # Function to capture frames in a separate thread
-        def capture_frames():
-            while self.running:
-                ret, frame = cap.read()
-                if ret:
-                    self.frame = frame
+        # Frames go from the capture thread to this loop through a sequence-numbered
+        # exchange, so the loop only wakes up for frames it has not processed yet
+        self.frames = FrameExchange()
+        reader = self.frames.reader()
+
+        # Grab every frame off the stream but only decode the ones this loop will use:
+        # every Nth frame as picked by the skip controller, and only once the last one was taken
+        grabber = FrameGrabber(cap, self.frames, decode_stride=self.skip_controller.stride,
+                               decode_scale=self.decode_scale)
 
         # Start a thread to capture frames
-        thread = threading.Thread(target=capture_frames)
+        thread = threading.Thread(target=grabber.run, args=(lambda: self.running,))
         thread.start()
 
         while True:
-            if self.frame is not None:
-                # Skip every 2nd frame to reduce processing load
-                if self.frame_skip % 2 == 0:
-                    # Convert the frame to grayscale for face detection
-                    gray = cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY)
-
-                    # Detect faces
-                    faces = self.face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
-
-                    # If faces are detected, add the price for each face
-                    if len(faces) > 0:
-                        self.detected_faces = len(faces)
-                        self.total_price = self.detected_faces * self.price  # Calculate total price based on detected faces
-
-                    # Draw rectangles around detected faces
-                    for (x, y, w, h) in faces:
-                        # Draw rectangle around the face
-                        cv2.rectangle(self.frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
-
-                        # Display price tag for each face
-                        cv2.putText(self.frame, f"Price: ${self.price}", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
-
-                    # Display the frame with face detection
-                    cv2.imshow("Mobile Cam - Face Detection", self.frame)
-
-                self.frame_skip += 1
+            # Wait (briefly, so the window keeps handling keys) for a frame newer than the last one
+            frame = reader.wait(timeout=0.03)
+            if frame is not None:
+                self.frame = frame
+                # Convert the frame to grayscale for face detection
+                gray = cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY)
+
+                # Detect faces
+                started = time.perf_counter()
+                faces = self.face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+                self.skip_controller.record(time.perf_counter() - started)
+                grabber.decode_stride = self.skip_controller.stride
+
+                # If faces are detected, add the price for each face
+                if len(faces) > 0:
+                    self.detected_faces = len(faces)
+                    self.total_price = self.detected_faces * self.price  # Calculate total price based on detected faces
+
+                # Draw rectangles around detected faces
+                for (x, y, w, h) in faces:
+                    # Draw rectangle around the face
+                    cv2.rectangle(self.frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
+
+                    # Display price tag for each face
+                    cv2.putText(self.frame, f"Price: ${self.price}", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
+
+                # Show the current inference stride and latency budget
+                cv2.putText(self.frame, self.skip_controller.status(),
+                            (30, self.frame.shape[0] - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+
+                # Display the frame with face detection
+                cv2.imshow("Mobile Cam - Face Detection", self.frame)
 
             # Capture the photo when 'c' is pressed
             key = cv2.waitKey(1)
@@ -93,8 +106,11 @@ class MobileCamera:
                 self.running = False
                 break
 
-        cap.release()
         thread.join()
+        cap.release()
+        print(f"Frames grabbed: {grabber.grabbed}, decoded: {grabber.decoded}")
+        stats = reader.stats()
+        print(f"Frames processed: {stats['received']}, dropped: {stats['dropped']}, stale waits: {stats['stale']}")
         cv2.destroyAllWindows()
 
 # Create an instance of MobileCamera
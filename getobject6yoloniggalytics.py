@@ -1,15 +1,21 @@
 import cv2
 import threading
+import time
 import numpy as np
-from ultralytics import YOLO
+from detector import load_model
+from framebuffer import FrameExchange, FrameGrabber
+from skipcontroller import FrameSkipController
 
 class MobileCamera:
-    def __init__(self):
+    def __init__(self, backend='torch'):
         # Load YOLOv8 model for object detection
-        self.model = YOLO('yolov8n.pt')  # Use 'yolov8n.pt' or any desired model
+        # backend: 'torch' (PyTorch), 'onnx' / 'openvino' for faster CPU-only inference,
+        # or 'onnx-int8' for the quantized model (refused until int8report.py has written int8_report.txt)
+        self.model = load_model('yolov8n.pt', backend)  # Use 'yolov8n.pt' or any desired model
         self.frame = None
         self.running = True
-        self.frame_skip = 0  # Initialize frame skip
+        self.decode_scale = 1  # 1 = full size, 2 or 4 = decode camera JPEGs at 1/2 or 1/4 size
+        self.skip_controller = FrameSkipController()  # Picks the inference stride and imgsz from measured latency
         self.photo_count = 0  # To count the saved photos
         self.price = 10  # Example price for each detected object
         self.total_price = 0  # To accumulate the total price
@@ -24,53 +30,62 @@ class MobileCamera:
         cap.set(cv2.CAP_PROP_FRAME_WIDTH, 960)
         cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
 
-        # Function to capture frames in a separate thread
-        def capture_frames():
-            while self.running:
-                ret, frame = cap.read()
-                if ret:
-                    self.frame = frame
+        # Frames go from the capture thread to this loop through a sequence-numbered
+        # exchange, so the loop only wakes up for frames it has not processed yet
+        self.frames = FrameExchange()
+        reader = self.frames.reader()
+
+        # Grab every frame off the stream but only decode the ones this loop will use:
+        # every Nth frame as picked by the skip controller, and only once the last one was taken
+        grabber = FrameGrabber(cap, self.frames, decode_stride=self.skip_controller.stride,
+                               decode_scale=self.decode_scale)
 
         # Start a thread to capture frames
-        thread = threading.Thread(target=capture_frames)
+        thread = threading.Thread(target=grabber.run, args=(lambda: self.running,))
         thread.start()
 
         while True:
-            if self.frame is not None:
-                # Skip every 2nd frame to reduce processing load
-                if self.frame_skip % 2 == 0:
-                    # Detect objects using YOLOv8 model
-                    results = self.model(self.frame)
-
-                    # Loop over detected objects
-                    for result in results:
-                        boxes = result.boxes
-                        for box in boxes:
-                            # Extract bounding box and confidence score
-                            x1, y1, x2, y2 = map(int, box.xyxy[0])
-                            conf = box.conf[0]
-                            cls = int(box.cls[0])
-
-                            # Only show results with high confidence
-                            if conf > 0.5:  # Threshold for confidence
-                                # Draw rectangle for detected object
-                                cv2.rectangle(self.frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
-
-                                # Get object class name from YOLO
-                                class_name = self.model.names[cls]
-
-                                # Display class name and price tag
-                                price_tag = self.price  # Use defined price
-                                cv2.putText(self.frame, f"{class_name}: ${price_tag}", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
-
-                    # If objects are detected, add the price for each object
-                    self.detected_objects = len(boxes)
-                    self.total_price = self.detected_objects * self.price  # Calculate total price based on detected objects
-
-                    # Display the frame with object detection
-                    cv2.imshow("Mobile Cam - Object Detection", self.frame)
-
-                self.frame_skip += 1
+            # Wait (briefly, so the window keeps handling keys) for a frame newer than the last one
+            frame = reader.wait(timeout=0.03)
+            if frame is not None:
+                self.frame = frame
+                # Detect objects using YOLOv8 model, timing it so the skip controller can adapt
+                started = time.perf_counter()
+                results = self.model(self.frame, imgsz=self.skip_controller.imgsz)
+                self.skip_controller.record(time.perf_counter() - started)
+                grabber.decode_stride = self.skip_controller.stride
+
+                # Loop over detected objects
+                for result in results:
+                    boxes = result.boxes
+                    for box in boxes:
+                        # Extract bounding box and confidence score
+                        x1, y1, x2, y2 = map(int, box.xyxy[0])
+                        conf = box.conf[0]
+                        cls = int(box.cls[0])
+
+                        # Only show results with high confidence
+                        if conf > 0.5:  # Threshold for confidence
+                            # Draw rectangle for detected object
+                            cv2.rectangle(self.frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
+
+                            # Get object class name from YOLO
+                            class_name = self.model.names[cls]
+
+                            # Display class name and price tag
+                            price_tag = self.price  # Use defined price
+                            cv2.putText(self.frame, f"{class_name}: ${price_tag}", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
+
+                # If objects are detected, add the price for each object
+                self.detected_objects = len(boxes)
+                self.total_price = self.detected_objects * self.price  # Calculate total price based on detected objects
+
+                # Show the current inference stride and latency budget
+                cv2.putText(self.frame, self.skip_controller.status(),
+                            (30, self.frame.shape[0] - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+
+                # Display the frame with object detection
+                cv2.imshow("Mobile Cam - Object Detection", self.frame)
 
             # Capture the photo when 'c' is pressed
             key = cv2.waitKey(1)
@@ -103,8 +118,11 @@ class MobileCamera:
                 self.running = False
                 break
 
-        cap.release()
         thread.join()
+        cap.release()
+        print(f"Frames grabbed: {grabber.grabbed}, decoded: {grabber.decoded}")
+        stats = reader.stats()
+        print(f"Frames processed: {stats['received']}, dropped: {stats['dropped']}, stale waits: {stats['stale']}")
         cv2.destroyAllWindows()
 
 # Create an instance of MobileCamera
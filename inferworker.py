@@ -0,0 +1,147 @@
+import multiprocessing as mp
+import os
+import queue
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+
+def worker_main(weights, backend, requests, results):
+    # Runs in the worker process: owns the model, reads frames straight out of the
+    # shared-memory ring and sends back only the detection arrays
+    from detector import load_model
+    from detections import box_arrays
+
+    try:
+        model = load_model(weights, backend)
+    except Exception as e:  # Missing weights, backend not installed...: tell the main process why
+        results.put(('error', f"{type(e).__name__}: {e}"))
+        return
+    results.put(('names', model.names))
+
+    shm = None
+    ring = None
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+
+        if message[0] == 'attach':
+            _, name, slots, shape = message
+            # Attaching registers the segment with the main process's resource tracker (already
+            # tracked there, so nothing changes); the main process unlinks it in close()
+            shm = shared_memory.SharedMemory(name=name)
+            ring = np.ndarray((slots,) + shape, dtype=np.uint8, buffer=shm.buf)
+            continue
+
+        _, job_id, slot, imgsz, classes = message
+        started = time.perf_counter()
+        detections = model(ring[slot], imgsz=imgsz, classes=classes, verbose=False)
+        elapsed = time.perf_counter() - started
+
+        boxes, confs, cls = box_arrays(detections, conf_threshold=0.25)
+        results.put(('result', job_id, slot, boxes.astype(np.int32), confs.astype(np.float32),
+                     cls.astype(np.int16), elapsed))
+
+    if shm is not None:
+        del ring
+        shm.close()
+
+
+class InferenceWorker:
+    # Runs the YOLO model in its own process so inference no longer competes with
+    # the capture thread and the preview for the GIL. Frames are copied into a small
+    # ring of shared-memory slots instead of being pickled through a queue; only the
+    # slot number goes over the queue, and detections come back as compact arrays.
+    def __init__(self, weights='yolov8n.pt', backend='torch', slots=2, load_timeout=120):
+        self.slots = slots
+        if os.name == 'posix':
+            # Start the resource tracker before the worker so both processes share it, whatever
+            # the start method: the shared-memory segment is then tracked once, cleaned up if this
+            # process crashes, and not unlinked behind our back when the worker exits
+            resource_tracker.ensure_running()
+        self.requests = mp.Queue()
+        self.results = mp.Queue()
+        self.process = mp.Process(target=worker_main, args=(weights, backend, self.requests, self.results),
+                                  daemon=True)
+        self.process.start()
+
+        # The worker reports the class names once its model is loaded
+        self.names = self.wait_for_model(load_timeout)
+
+        self.shm = None  # Created on the first frame, once the frame size is known
+        self.ring = None
+        self.in_flight = {}  # job id -> slot
+        self.next_job = 0
+        self.next_slot = 0
+
+    def wait_for_model(self, timeout):
+        # Class names from the worker; raises if it failed or died instead of waiting forever
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                kind, value = self.results.get(timeout=0.5)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    raise RuntimeError(f"Inference worker exited with code {self.process.exitcode} "
+                                       "before loading the model")
+                if time.monotonic() > deadline:
+                    self.process.terminate()
+                    raise RuntimeError(f"Inference worker didn't load the model within {timeout} s")
+                continue
+            if kind == 'error':
+                self.process.join(timeout=5)
+                raise RuntimeError(f"Inference worker couldn't load the model: {value}")
+            return value
+
+    def busy(self):
+        return len(self.in_flight) >= self.slots - 1  # Always keep one slot free for writing
+
+    def submit(self, frame, imgsz=None, classes=None):
+        # Queue a frame for inference; returns the job id, or None when the worker is busy
+        if self.busy():
+            return None
+
+        if self.ring is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=self.slots * frame.nbytes)
+            self.ring = np.ndarray((self.slots,) + frame.shape, dtype=np.uint8, buffer=self.shm.buf)
+            self.requests.put(('attach', self.shm.name, self.slots, frame.shape))
+        elif frame.shape != self.ring.shape[1:]:
+            print(f"Frame size changed to {frame.shape}, expected {self.ring.shape[1:]}; skipping frame")
+            return None
+
+        # Pick a slot the worker isn't reading from
+        busy_slots = set(self.in_flight.values())
+        while self.next_slot in busy_slots:
+            self.next_slot = (self.next_slot + 1) % self.slots
+        slot = self.next_slot
+        self.next_slot = (self.next_slot + 1) % self.slots
+
+        self.ring[slot] = frame
+        job_id = self.next_job
+        self.next_job += 1
+        self.in_flight[job_id] = slot
+        self.requests.put(('detect', job_id, slot, imgsz, classes))
+        return job_id
+
+    def poll(self):
+        # Finished jobs as (job_id, boxes, confs, classes, seconds), without blocking
+        finished = []
+        while True:
+            try:
+                _, job_id, slot, boxes, confs, classes, elapsed = self.results.get_nowait()
+            except queue.Empty:
+                return finished
+            self.in_flight.pop(job_id, None)
+            finished.append((job_id, boxes, confs, classes, elapsed))
+
+    def close(self):
+        self.requests.put(None)
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        if self.shm is not None:
+            self.ring = None
+            self.shm.close()
+            self.shm.unlink()
@@ -0,0 +1,110 @@
+import glob
+import time
+from collections import defaultdict
+
+import cv2
+import numpy as np
+
+from detector import CALIBRATION_PHOTOS, INT8_REPORT, load_model
+
+# Compares the INT8 model against the FP32 ONNX model on the sample checkout photos.
+# These are the same photos the INT8 model was calibrated on, so the agreement it
+# reports is optimistic; check on photos from snapshots/ before relying on it.
+# The FP32 detections are taken as the reference: for each class we report how many
+# INT8 boxes match one of them (precision) and how many of them INT8 finds (recall),
+# how often the per-photo count of a class differs (that is what ends up on the bill),
+# and how much faster the INT8 model runs.
+
+CONFIDENCE = 0.5  # Same threshold the camera loop uses
+IOU_MATCH = 0.5  # Boxes of the same class overlapping this much count as the same object
+TIMING_RUNS = 5  # Inferences per photo when measuring speed
+
+
+def detect(model, image):
+    result = model(image, verbose=False)[0]
+    keep = result.boxes.conf.cpu().numpy() > CONFIDENCE
+    return result.boxes.xyxy.cpu().numpy()[keep], result.boxes.cls.cpu().numpy().astype(int)[keep]
+
+
+def iou(box, boxes):
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / (area + areas - inter + 1e-9)
+
+
+def match(reference, candidate):
+    # Greedy one-to-one matching per class, returns (matched, reference only, candidate only) per class
+    stats = defaultdict(lambda: [0, 0, 0])
+    ref_boxes, ref_cls = reference
+    cand_boxes, cand_cls = candidate
+    for cls in set(ref_cls) | set(cand_cls):
+        refs = ref_boxes[ref_cls == cls]
+        cands = cand_boxes[cand_cls == cls]
+        used = np.zeros(len(cands), dtype=bool)
+        for box in refs:
+            overlaps = iou(box, cands) if len(cands) else np.zeros(0)
+            overlaps[used] = 0
+            if len(overlaps) and overlaps.max() >= IOU_MATCH:
+                used[overlaps.argmax()] = True
+                stats[cls][0] += 1
+            else:
+                stats[cls][1] += 1
+        stats[cls][2] += int((~used).sum())
+    return stats
+
+
+def time_model(model, images):
+    started = time.perf_counter()
+    for image in images:
+        for _ in range(TIMING_RUNS):
+            model(image, verbose=False)
+    return (time.perf_counter() - started) * 1000 / (len(images) * TIMING_RUNS)
+
+
+def main(report_path=INT8_REPORT):
+    paths = sorted(glob.glob(CALIBRATION_PHOTOS))
+    images = [cv2.imread(path) for path in paths]
+    fp32 = load_model('yolov8n.pt', 'onnx')
+    int8 = load_model('yolov8n.pt', 'onnx-int8', allow_unvalidated=True)  # This is the validation
+    names = fp32.names
+
+    totals = defaultdict(lambda: [0, 0, 0])
+    count_mismatches = defaultdict(int)
+    for image in images:
+        reference = detect(fp32, image)
+        candidate = detect(int8, image)
+        for cls, (matched, missed, extra) in match(reference, candidate).items():
+            totals[cls][0] += matched
+            totals[cls][1] += missed
+            totals[cls][2] += extra
+            if np.sum(reference[1] == cls) != np.sum(candidate[1] == cls):
+                count_mismatches[cls] += 1
+
+    fp32_ms = time_model(fp32, images)
+    int8_ms = time_model(int8, images)
+
+    lines = [f"INT8 vs FP32 on {len(images)} photos (confidence > {CONFIDENCE}, IoU >= {IOU_MATCH})",
+             "Note: these are the same photos the INT8 model was calibrated on, so precision,",
+             "recall and count agreement are optimistic; the speedup is unaffected.", "",
+             f"{'Class':<16}{'FP32':>6}{'INT8':>6}{'Precision':>11}{'Recall':>8}{'Count differs':>15}"]
+    for cls in sorted(totals, key=lambda c: names[c]):
+        matched, missed, extra = totals[cls]
+        precision = matched / (matched + extra) if matched + extra else 1.0
+        recall = matched / (matched + missed) if matched + missed else 1.0
+        lines.append(f"{names[cls]:<16}{matched + missed:>6}{matched + extra:>6}{precision:>11.2f}{recall:>8.2f}"
+                     f"{count_mismatches[cls]:>9} photos")
+    lines += ["", f"FP32: {fp32_ms:.1f} ms/image, INT8: {int8_ms:.1f} ms/image, speedup {fp32_ms / int8_ms:.2f}x"]
+
+    report = "\n".join(lines)
+    print(report)
+    with open(report_path, 'w') as f:
+        f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
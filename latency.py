@@ -0,0 +1,115 @@
+import time
+
+# Pipeline stages timed by MobileCamera, in the order a frame goes through them
+STAGES = ('capture', 'decode', 'inference', 'postprocess', 'overlay', 'show', 'checkout', 'capture_photo')
+
+SUB_BUCKETS = 16  # Buckets per power of two: a recorded value is off by at most 1/32 of itself
+MAX_SHIFT = 28  # Up to 2^32 microseconds (over an hour); anything longer lands in the last bucket
+
+
+class LatencyHistogram:
+    # HDR-style histogram of durations: exact up to 32 microseconds, then SUB_BUCKETS
+    # buckets per power of two, so recording is a couple of integer operations and the
+    # memory is fixed however many samples come in, while p99 stays within ~3%.
+    def __init__(self):
+        self.counts = [0] * (SUB_BUCKETS * (MAX_SHIFT + 2))
+        self.count = 0
+        self.total = 0  # Microseconds
+        self.max = 0
+
+    def record(self, seconds):
+        value = int(seconds * 1e6)
+        shift = max(0, value.bit_length() - 5)
+        index = SUB_BUCKETS * shift + (value >> shift) if shift <= MAX_SHIFT else len(self.counts) - 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def value(self, index):
+        # Middle of a bucket, in microseconds
+        if index < 2 * SUB_BUCKETS:
+            return index
+        shift = index // SUB_BUCKETS - 1
+        return ((index - SUB_BUCKETS * shift) << shift) + (1 << shift) // 2
+
+    def percentiles(self, *quantiles):
+        # Values in milliseconds at the given percentiles (e.g. 50, 95, 99), in one pass
+        targets = [max(1, -(-self.count * quantile // 100)) for quantile in quantiles]
+        results = [0.0] * len(targets)
+        seen = 0
+        pending = 0
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            seen += count
+            while pending < len(targets) and seen >= targets[pending]:
+                results[pending] = min(self.value(index), self.max) / 1000
+                pending += 1
+            if pending == len(targets):
+                break
+        return results
+
+
+class LatencyStats:
+    # Per-stage latency histograms and per-frame counters for one camera. Off by
+    # default; while disabled start() returns 0 and stop() returns right away, so the
+    # timing calls can stay in the loop. Each stage is recorded from one thread only.
+    def __init__(self, enabled=False, stages=STAGES, refresh_interval=1.0):
+        self.enabled = enabled
+        self.stages = stages
+        self.refresh_interval = refresh_interval  # Seconds between updates of the on-screen lines
+        self.reset()
+
+    def reset(self):
+        self.histograms = {stage: LatencyHistogram() for stage in self.stages}
+        self.counters = {}  # Name -> count (frames shown, inferences, scans...)
+        self.since = time.monotonic()
+        self.lines = []
+        self.refreshed = 0
+
+    def start(self):
+        return time.perf_counter() if self.enabled else 0
+
+    def stop(self, stage, started):
+        if started:
+            self.histograms[stage].record(time.perf_counter() - started)
+
+    def record(self, stage, seconds):
+        # For a duration measured elsewhere (e.g. by the inference worker process)
+        if self.enabled:
+            self.histograms[stage].record(seconds)
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def summary(self):
+        # One line per stage that has samples, then the counters as totals and rates
+        elapsed = max(time.monotonic() - self.since, 1e-9)
+        lines = []
+        for stage, histogram in self.histograms.items():
+            if histogram.count:
+                p50, p95, p99 = histogram.percentiles(50, 95, 99)
+                lines.append(f"{stage:<13} n={histogram.count:<6} p50 {p50:7.2f}  p95 {p95:7.2f}  "
+                             f"p99 {p99:7.2f}  max {histogram.max / 1000:7.2f} ms")
+        if self.counters:
+            lines.append("  ".join(f"{name} {count} ({count / elapsed:.1f}/s)"
+                                   for name, count in sorted(self.counters.items())))
+        return lines
+
+    def status(self):
+        # summary() for drawing on every frame, recomputed at most once per refresh_interval
+        if time.monotonic() - self.refreshed >= self.refresh_interval:
+            self.lines = self.summary()
+            self.refreshed = time.monotonic()
+        return self.lines
+
+    def dump(self, path='latency.txt'):
+        # Append a timestamped report to path; returns the path
+        with open(path, 'a') as file:
+            file.write(f"# {time.strftime('%Y-%m-%d %H:%M:%S')}, "
+                       f"{time.monotonic() - self.since:.1f} s of samples\n")
+            file.write("\n".join(self.summary()) + "\n\n")
+        return path
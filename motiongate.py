@@ -0,0 +1,43 @@
+import cv2
+
+
+class MotionGate:
+    # Cheap change detector that sits in front of the YOLO model. Each frame is
+    # shrunk to a small grayscale thumbnail and compared with the thumbnail of the
+    # last frame that was actually sent to the model. Inference only runs when
+    # enough of the picture has changed since then.
+    def __init__(self, threshold=0.01, pixel_threshold=25, size=(64, 48), refresh=60):
+        self.threshold = threshold  # Fraction of thumbnail pixels that must change to count as motion
+        self.pixel_threshold = pixel_threshold  # Grayscale difference (0-255) for a pixel to count as changed
+        self.size = size  # Thumbnail size used for the comparison
+        self.refresh = refresh  # Force an inference after this many skipped frames, 0 = never
+        self.reference = None  # Thumbnail of the last inferred frame
+        self.since_inference = 0
+        self.checked = 0  # Frames looked at by the gate
+        self.skipped = 0  # Inferences saved because nothing moved
+
+    def thumbnail(self, frame):
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def changed(self, frame):
+        # Returns True when the frame should go through the model
+        self.checked += 1
+        thumb = self.thumbnail(frame)
+
+        if self.reference is not None and not (self.refresh and self.since_inference >= self.refresh):
+            diff = cv2.absdiff(thumb, self.reference)
+            changed_pixels = cv2.countNonZero(cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)[1])
+            if changed_pixels < self.threshold * thumb.size:
+                self.since_inference += 1
+                self.skipped += 1
+                return False
+
+        self.reference = thumb
+        self.since_inference = 0
+        return True
+
+    def reset(self):
+        # Make the next frame go through the model no matter what
+        self.reference = None
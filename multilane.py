@@ -0,0 +1,164 @@
+import sys
+import threading
+import time
+
+import cv2
+
+from detectcashier import MobileCamera
+from detector import load_model
+from framebuffer import FrameExchange, FrameGrabber
+from scheduler import InferenceScheduler
+from skipcontroller import FrameSkipController, preview_sizes
+from snapshotstore import SnapshotStore
+
+
+class Lane:
+    # One checkout lane: its camera, its grabber thread, its window and its own cart.
+    # The cart side is a MobileCamera that shares the runner's model and photo
+    # archive instead of loading its own copies.
+    def __init__(self, number, url, model, scheduler, snapshots):
+        self.number = number
+        self.scheduler = scheduler
+        self.url = url
+        self.window = f"Lane {number} - Object Detection"
+        self.camera = MobileCamera(model=model, snapshots=snapshots)
+        self.camera.camera = url
+        self.camera.lane = number
+        self.camera.skip_controller = scheduler.skip_controller  # Fed by the scheduler's model calls
+
+        self.cap = cv2.VideoCapture(url)
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 960)
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+        self.frames = FrameExchange()
+        self.reader = self.frames.reader()
+        # Every frame is decoded for the window, like a single-lane camera; the skip
+        # controller's stride applies to the preview jobs instead (see new_frame)
+        self.grabber = FrameGrabber(self.cap, self.frames, decode_stride=1, decode_scale=self.camera.decode_scale)
+        self.thread = threading.Thread(target=self.grabber.run, args=(lambda: self.camera.running,))
+        self.preview_job = None  # Preview inference in flight
+        self.last_seq = 0  # Last frame considered for a preview job
+        self.scan_job = None  # Scan inference in flight
+
+    def start(self):
+        self.thread.start()
+        cv2.namedWindow(self.window)
+        cv2.setMouseCallback(self.window, self.mouse_callback)
+
+    def mouse_callback(self, event, x, y, flags, param):
+        if event == cv2.EVENT_LBUTTONDOWN:
+            # Same button layout as the single-lane window
+            if 30 < x < 150 and 30 < y < 80:
+                self.scan()
+            if 180 < x < 300 and 30 < y < 80:
+                self.camera.retry_action()
+            if 330 < x < 450 and 30 < y < 80:
+                self.stop()
+
+    def scan(self):
+        # Queue the current frame as a scan job: it jumps ahead of all preview work
+        if self.camera.frame is not None and self.scan_job is None:
+            self.scan_job = self.scheduler.submit_scan(self.number, self.camera.frame, self.camera.detect_classes())
+
+    def new_frame(self, frame):
+        self.camera.frame = frame
+        self.camera.check_prices()
+        # The same stride as a single-lane camera: the shared skip controller's, doubled
+        # while this lane's items sit still
+        if self.reader.seq - self.last_seq < self.camera.inference_stride():
+            return
+        self.last_seq = self.reader.seq
+        if self.camera.motion_gate.changed(frame):
+            # Best effort: replaces this lane's previous preview job if it hasn't run yet
+            self.preview_job = self.scheduler.submit_preview(self.number, frame, self.camera.detect_classes())
+
+    def collect(self):
+        # Apply whatever the scheduler has finished for this lane
+        job = self.preview_job
+        if job is not None and job.done.is_set():
+            self.preview_job = None
+            if not job.dropped:
+                self.camera.update_cart(*job.result)
+
+        job = self.scan_job
+        if job is not None and job.done.is_set():
+            self.scan_job = None
+            self.camera.frame = job.frame
+            self.camera.capture_photo(job.result)
+
+    def show(self):
+        self.camera.expire_capture()
+        # Draw on a copy: the scheduler may still be reading the frame itself
+        frame = self.camera.frame.copy()
+        self.camera.draw_detections(frame)
+        self.camera.draw_buttons(frame)
+        cv2.putText(frame, self.scheduler.lane_stats(self.number).status(self.scheduler.depth(self.number)),
+                    (30, frame.shape[0] - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+        cv2.imshow(self.window, frame)
+
+    def stop(self):
+        if self.camera.running:
+            self.camera.running = False
+            cv2.destroyWindow(self.window)
+
+    def close(self):
+        self.camera.running = False
+        self.thread.join()
+        self.cap.release()
+
+
+class MultiLaneRunner:
+    # Runs several checkout lanes from one process with one copy of the model.
+    # Each lane has its own grabber thread; the newest frame of every lane whose scene
+    # changed goes to the inference scheduler, which batches preview frames from all
+    # lanes into single model calls and puts Scan requests ahead of them.
+    def __init__(self, urls, backend='torch', max_batch=8, preview_imgsz=320, scan_imgsz=960):
+        # preview_imgsz / scan_imgsz: model input size for the live preview and for Scan,
+        # the same two tiers as a single-lane MobileCamera
+        self.model = load_model('yolov8n.pt', backend)
+        # Shared: every lane runs on the same hardware
+        self.skip_controller = FrameSkipController(sizes=preview_sizes(preview_imgsz))
+        self.scheduler = InferenceScheduler(self.model, self.skip_controller, scan_imgsz=scan_imgsz,
+                                            max_batch=max_batch)
+        # One photo archive for all lanes: a single SQLite connection writing snapshots/index.db
+        self.snapshots = SnapshotStore()
+        self.lanes = [Lane(number + 1, url, self.model, self.scheduler, self.snapshots)
+                      for number, url in enumerate(urls)]
+
+    def run(self):
+        self.scheduler.start()
+        for lane in self.lanes:
+            lane.start()
+
+        while any(lane.camera.running for lane in self.lanes):
+            updated = False
+            for lane in self.lanes:
+                if not lane.camera.running:
+                    continue
+                lane.collect()
+                frame = lane.reader.wait(timeout=0)
+                if frame is not None:
+                    lane.new_frame(frame)
+                    lane.show()
+                    updated = True
+
+            if not updated:
+                time.sleep(0.005)  # Nothing new on any lane, don't spin
+
+            key = cv2.waitKey(1)
+            if key == ord('q'):  # Quit every lane
+                break
+
+        self.scheduler.stop()
+        for lane in self.lanes:
+            lane.close()
+            stats = self.scheduler.lane_stats(lane.number)
+            print(f"Lane {lane.number}: {stats.previews} previews, {stats.dropped} dropped, "
+                  f"{stats.scans} scans, worst scan wait {stats.scan_wait_max_ms:.0f} ms")
+        self.snapshots.close()  # Finish writing the photos still queued
+        cv2.destroyAllWindows()
+
+
+if __name__ == "__main__":
+    # Camera URLs on the command line, one per lane
+    urls = sys.argv[1:] or ["http://192.168.1.137:8080/video"]
+    MultiLaneRunner(urls).run()
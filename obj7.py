@@ -1,29 +1,35 @@
 import cv2
 import threading
+import time
 import numpy as np
 from collections import defaultdict
-from ultralytics import YOLO
+from detector import load_model
+from framebuffer import FrameExchange, FrameGrabber
+from skipcontroller import FrameSkipController
+from snapshotstore import SnapshotStore
+from cart import to_cents
+from pricecatalog import PriceCatalog, price_file
 
 
 class MobileCamera:
-    def __init__(self):
+    def __init__(self, backend='torch'):
         # Load YOLOv8 model for object detection
-        self.model = YOLO('yolov8n.pt')  # Use 'yolov8n.pt' or any desired model
+        # backend: 'torch' (PyTorch), 'onnx' / 'openvino' for faster CPU-only inference,
+        # or 'onnx-int8' for the quantized model (refused until int8report.py has written int8_report.txt)
+        self.model = load_model('yolov8n.pt', backend)  # Use 'yolov8n.pt' or any desired model
         self.frame = None
         self.running = True
-        self.frame_skip = 0  # Initialize frame skip
+        self.decode_scale = 1  # 1 = full size, 2 or 4 = decode camera JPEGs at 1/2 or 1/4 size
+        self.skip_controller = FrameSkipController()  # Picks the inference stride and imgsz from measured latency
         self.photo_count = 0  # To count the saved photos
+        self.snapshots = SnapshotStore()  # Saves photos in the background into snapshots/ (see snapshotstore.py)
         self.total_price = 0  # To accumulate the total price
         self.detected_objects = defaultdict(lambda: {'count': 0, 'total': 0})  # Track each object and its total cost
         self.show_price_window = False  # Flag to control the display of the price window
 
-        # Dictionary to store prices for specific object classes
-        self.prices = {
-            "apple": 1,  # Price of an apple is $1
-            "banana": 2,  # Price of a banana is $2
-            "orange": 3,  # Price of an orange is $3
-            # Add more object types and their prices here
-        }
+        # Prices for specific object classes, from prices_obj.json, shared with obj8tinker (add more object types there);
+        # objects not in the file cost 10. Editing the file takes effect without a restart.
+        self.catalog = PriceCatalog(self.model.names, price_file("prices_obj.json"), default=10)
 
     def getVideo(self, camera):
         self.camera = camera
@@ -33,15 +39,18 @@ class MobileCamera:
         cap.set(cv2.CAP_PROP_FRAME_WIDTH, 960)
         cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
 
-        # Function to capture frames in a separate thread
-        def capture_frames():
-            while self.running:
-                ret, frame = cap.read()
-                if ret:
-                    self.frame = frame
+        # Frames go from the capture thread to this loop through a sequence-numbered
+        # exchange, so the loop only wakes up for frames it has not processed yet
+        self.frames = FrameExchange()
+        reader = self.frames.reader()
+
+        # Grab every frame off the stream but only decode the ones this loop will use:
+        # every Nth frame as picked by the skip controller, and only once the last one was taken
+        grabber = FrameGrabber(cap, self.frames, decode_stride=self.skip_controller.stride,
+                               decode_scale=self.decode_scale)
 
         # Start a thread to capture frames
-        thread = threading.Thread(target=capture_frames)
+        thread = threading.Thread(target=grabber.run, args=(lambda: self.running,))
         thread.start()
 
         def mouse_callback(event, x, y, flags, param):
@@ -63,60 +72,69 @@ class MobileCamera:
         cv2.setMouseCallback("Mobile Cam - Object Detection", mouse_callback)
 
         while True:
-            if self.frame is not None:
-                # Skip every 2nd frame to reduce processing load
-                if self.frame_skip % 2 == 0:
-                    # Detect objects using YOLOv8 model
-                    results = self.model(self.frame)
-
-                    # Reset detected objects and total price for this frame
-                    self.detected_objects.clear()
-                    self.total_price = 0
-
-                    # Loop over detected objects
-                    for result in results:
-                        boxes = result.boxes
-                        for box in boxes:
-                            # Extract bounding box and confidence score
-                            x1, y1, x2, y2 = map(int, box.xyxy[0])
-                            conf = box.conf[0]
-                            cls = int(box.cls[0])
-
-                            # Only show results with high confidence
-                            if conf > 0.5:  # Threshold for confidence
-                                # Draw rectangle for detected object
-                                cv2.rectangle(self.frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
-
-                                # Get object class name from YOLO
-                                class_name = self.model.names[cls]
-
-                                # Get price from the price dictionary
-                                price_tag = self.prices.get(class_name.lower(),
-                                                            10)  # Default price is 10 if the object is not in the dictionary
-
-                                # Display class name and price tag on the video frame
-                                cv2.putText(self.frame, f"{class_name}: ${price_tag}",
-                                            (x1, y1 - 10),
-                                            cv2.FONT_HERSHEY_SIMPLEX,
-                                            1,  # Larger font scale for price display
-                                            (0, 255, 0),
-                                            2)  # Thicker font for better readability
-
-                                # Add the object, increment count and calculate total for each type
-                                self.detected_objects[class_name]['count'] += 1
-                                self.detected_objects[class_name]['total'] = self.detected_objects[class_name][
-                                                                                 'count'] * price_tag
-
-                    # Calculate the cumulative total price for all detected items
-                    self.total_price = sum(item['total'] for item in self.detected_objects.values())
-
-                    # Draw buttons for "Scan", "Retry", and "Quit"
-                    self.draw_buttons(self.frame)
-
-                    # Display the frame with object detection
-                    cv2.imshow("Mobile Cam - Object Detection", self.frame)
-
-                self.frame_skip += 1
+            # Wait (briefly, so the window keeps handling keys) for a frame newer than the last one
+            frame = reader.wait(timeout=0.03)
+            if frame is not None:
+                self.frame = frame
+                # Detect objects using YOLOv8 model, timing it so the skip controller can adapt
+                started = time.perf_counter()
+                results = self.model(self.frame, imgsz=self.skip_controller.imgsz)
+                self.skip_controller.record(time.perf_counter() - started)
+                grabber.decode_stride = self.skip_controller.stride
+
+                # Reset detected objects and total price for this frame
+                self.detected_objects.clear()
+                self.total_price = 0
+
+                # Pick up an edited price file, then price this whole frame with one table
+                self.catalog.poll()
+                price_table = self.catalog.table
+
+                # Loop over detected objects
+                for result in results:
+                    boxes = result.boxes
+                    for box in boxes:
+                        # Extract bounding box and confidence score
+                        x1, y1, x2, y2 = map(int, box.xyxy[0])
+                        conf = box.conf[0]
+                        cls = int(box.cls[0])
+
+                        # Only show results with high confidence
+                        if conf > 0.5:  # Threshold for confidence
+                            # Draw rectangle for detected object
+                            cv2.rectangle(self.frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
+
+                            # Get object class name from YOLO
+                            class_name = self.model.names[cls]
+
+                            # Get price from the catalog, indexed by class id
+                            price_tag = price_table.prices[cls].item()
+
+                            # Display class name and price tag on the video frame
+                            cv2.putText(self.frame, price_table.labels[cls],
+                                        (x1, y1 - 10),
+                                        cv2.FONT_HERSHEY_SIMPLEX,
+                                        1,  # Larger font scale for price display
+                                        (0, 255, 0),
+                                        2)  # Thicker font for better readability
+
+                            # Add the object, increment count and calculate total for each type
+                            self.detected_objects[class_name]['count'] += 1
+                            self.detected_objects[class_name]['total'] = self.detected_objects[class_name][
+                                                                             'count'] * price_tag
+
+                # Calculate the cumulative total price for all detected items
+                self.total_price = sum(item['total'] for item in self.detected_objects.values())
+
+                # Draw buttons for "Scan", "Retry", and "Quit"
+                self.draw_buttons(self.frame)
+
+                # Show the current inference stride and latency budget
+                cv2.putText(self.frame, self.skip_controller.status(),
+                            (30, self.frame.shape[0] - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+
+                # Display the frame with object detection
+                cv2.imshow("Mobile Cam - Object Detection", self.frame)
 
             # Capture keyboard input for 'c', 'e', and 'q'
             key = cv2.waitKey(1)
@@ -128,8 +146,12 @@ class MobileCamera:
                 self.quit_action()
                 break
 
-        cap.release()
         thread.join()
+        cap.release()
+        self.snapshots.close()  # Finish writing the photos still queued
+        print(f"Frames grabbed: {grabber.grabbed}, decoded: {grabber.decoded}")
+        stats = reader.stats()
+        print(f"Frames processed: {stats['received']}, dropped: {stats['dropped']}, stale waits: {stats['stale']}")
         cv2.destroyAllWindows()
 
     def draw_buttons(self, frame):
@@ -148,17 +170,15 @@ class MobileCamera:
     def capture_photo(self):
         # Save the current frame as an image
         if self.frame is not None:
-            photo_name = f"detected_photo_{self.photo_count}.jpg"
-            cv2.imwrite(photo_name, self.frame)
-            print(f"Photo saved: {photo_name}")
-
-            # Show the captured photo in a new window
-            captured_image = cv2.imread(photo_name)
-            if captured_image is not None:
-                cv2.imshow("Captured Photo", captured_image)
-                self.display_price_window()  # Show the price window after capturing the photo
-            else:
-                print("Error: Could not load the captured photo.")
+            # Archived with what it billed, in cents: (item, price, count, total) rows
+            cart = [(name, int(to_cents(item['total'] / item['count'])), item['count'], int(to_cents(item['total'])))
+                    for name, item in self.detected_objects.items()]
+            self.snapshots.record(self.frame, cart=cart, total=int(to_cents(self.total_price)))
+            print(f"Saving photo {self.photo_count} to {self.snapshots.root}")
+
+            # Show the captured photo in a new window, straight from memory
+            cv2.imshow("Captured Photo", self.frame)
+            self.display_price_window()  # Show the price window after capturing the photo
             self.photo_count += 1
 
     def retry_action(self):
@@ -196,7 +216,7 @@ class MobileCamera:
 
         # Display each detected object, its price, quantity, and total price
         for item_name, data in self.detected_objects.items():
-            price = self.prices.get(item_name.lower(), 10)
+            price = self.catalog.prices.get(item_name.lower(), self.catalog.default)
             count = data['count']
             total_for_item = data['total']
             item_text = f"Item: {item_name} Price: ${price} Amount: {count} Total: ${price} x {count} = ${total_for_item}"
@@ -0,0 +1,73 @@
+import cv2
+import numpy as np
+
+
+class Sprite:
+    # A pre-rendered piece of overlay: its colours and, per pixel, how much of it
+    # covers the frame (anti-aliased text edges are partly transparent)
+    def __init__(self, pixels, alpha, anchor=(0, 0)):
+        self.opaque = bool((alpha == 255).all())  # Plain copy, no blending needed
+        self.pixels = pixels
+        self.weights = alpha.astype(np.float32) / 255  # Weight of the sprite
+        self.inverse = 1 - self.weights  # Weight of the frame underneath
+        self.anchor = anchor  # Point of the sprite that goes on the requested position
+        self.shape = pixels.shape[:2]
+
+
+def render(ops, width, height, anchor=(0, 0)):
+    # Draw ('rect', pt1, pt2, color) and ('text', text, org, scale, color, thickness)
+    # operations once into a sprite, keeping the anti-aliased edges as coverage
+    pixels = np.zeros((height, width, 3), dtype=np.uint8)
+    alpha = np.zeros((height, width), dtype=np.uint8)
+    for op in ops:
+        if op[0] == 'rect':
+            _, pt1, pt2, color = op
+            cv2.rectangle(pixels, pt1, pt2, color, -1)
+            cv2.rectangle(alpha, pt1, pt2, 255, -1)
+        else:
+            _, text, org, scale, color, thickness = op
+            # Coverage from drawing the text in white. Where nothing is underneath, the
+            # pixels get the full colour and the edges come from the coverage; over a
+            # rectangle, putText blends the edges into it as it would on a frame
+            glyphs = np.zeros((height, width), dtype=np.uint8)
+            cv2.putText(glyphs, text, org, cv2.FONT_HERSHEY_SIMPLEX, scale, 255, thickness)
+            pixels[(glyphs > 0) & (alpha == 0)] = color
+            cv2.putText(pixels, text, org, cv2.FONT_HERSHEY_SIMPLEX, scale, color, thickness)
+            np.maximum(alpha, glyphs, out=alpha)
+    return Sprite(pixels, alpha, anchor)
+
+
+class OverlayCompositor:
+    # Keeps rendered buttons as sprites and copies them onto frames with array slicing,
+    # so their rectangles and text are only drawn once. Only worth it for opaque pieces:
+    # blending a text sprite's anti-aliased edges costs more than cv2.putText itself,
+    # so labels and status lines are drawn with putText directly.
+    def __init__(self, max_sprites=256):
+        self.max_sprites = max_sprites  # Oldest sprites are dropped beyond this
+        self.sprites = {}
+
+    def sprite(self, key, make):
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            if len(self.sprites) >= self.max_sprites:
+                del self.sprites[next(iter(self.sprites))]
+            sprite = self.sprites[key] = make()
+        return sprite
+
+    def blit(self, frame, sprite, position):
+        # Blend the sprite onto the frame, clipped to the frame edges
+        height, width = sprite.shape
+        x = position[0] - sprite.anchor[0]
+        y = position[1] - sprite.anchor[1]
+        x1, y1 = max(x, 0), max(y, 0)
+        x2, y2 = min(x + width, frame.shape[1]), min(y + height, frame.shape[0])
+        if x1 >= x2 or y1 >= y2:
+            return
+
+        target = frame[y1:y2, x1:x2]
+        region = slice(y1 - y, y2 - y), slice(x1 - x, x2 - x)
+        if sprite.opaque:
+            target[...] = sprite.pixels[region]
+        else:
+            target[...] = cv2.blendLinear(sprite.pixels[region], target,
+                                          sprite.weights[region], sprite.inverse[region])
@@ -0,0 +1,109 @@
+import csv
+import json
+import math
+import os
+import sqlite3
+import time
+
+from detections import PriceTable
+
+
+def price_file(name):
+    # Price files live next to this file, so they're found whatever directory a script runs from
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+
+
+# detectcashier's (and multilane's) price list; the other scripts keep their own, see price_file()
+PRICE_FILE = price_file("prices.json")
+
+
+def load_prices(path):
+    # {class name (lower case): price} from a .json object, a .csv with name,price
+    # columns, or a SQLite database with a prices(name, price) table
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.json':
+        with open(path) as file:
+            prices = json.load(file)
+    elif extension == '.csv':
+        with open(path, newline='') as file:
+            prices = {row['name']: row['price'] for row in csv.DictReader(file)}
+    elif extension in ('.db', '.sqlite', '.sqlite3'):
+        db = sqlite3.connect(path)
+        try:
+            prices = dict(db.execute("SELECT name, price FROM prices").fetchall())
+        finally:
+            db.close()
+    else:
+        raise ValueError(f"Unknown price file type: {path}")
+
+    if not isinstance(prices, dict):
+        raise ValueError(f"{path} must map item names to prices")
+    # Whole-dollar prices stay ints, like the old hard-coded dicts
+    return {check_name(name): number(name, price) for name, price in prices.items()}
+
+
+def check_name(name):
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError(f"Bad item name: {name!r}")
+    return name.strip().lower()
+
+
+def number(name, value):
+    # A finite, non-negative price; anything else rejects the whole file
+    try:
+        if isinstance(value, bool):
+            raise TypeError
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Bad price for {name}: {value!r}")
+    if not math.isfinite(value) or value < 0:
+        raise ValueError(f"Bad price for {name}: {value!r}")
+    return int(value) if value.is_integer() else value
+
+
+class PriceCatalog:
+    # Prices kept in a file instead of in the code, compiled into a PriceTable (arrays
+    # indexed by model class id) when loaded. poll() is cheap enough to call every frame:
+    # at most once per check_interval it looks at the file's mtime, and when the file
+    # changed it builds a new table and swaps it in with a single assignment, so a price
+    # change takes effect without restarting the camera or reloading the model.
+    # A file that can't be read (e.g. half-written) keeps the current prices.
+    def __init__(self, names=None, path=PRICE_FILE, default=None, check_interval=1.0):
+        self.names = names  # Model class names; None to only keep the name -> price dict
+        self.path = path
+        self.default = default  # Price billed for classes not in the file (None = not billed)
+        self.check_interval = check_interval
+        self.prices = {}
+        self.table = PriceTable(names, {}, default) if names is not None else None
+        self.mtime = None
+        self.checked = 0
+        self.version = 0  # Goes up with every successful reload
+        self.error = None  # Last load error, printed once rather than on every check
+        self.reload()
+
+    def reload(self):
+        # Returns True when new prices were loaded
+        self.checked = time.monotonic()
+        try:
+            mtime = os.path.getmtime(self.path)
+            if mtime == self.mtime:
+                return False
+            prices = load_prices(self.path)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError, sqlite3.Error) as e:
+            if str(e) != self.error:
+                print(f"Error loading prices from {self.path}: {e}")
+                self.error = str(e)
+            self.mtime = None  # Try again on the next check
+            return False
+
+        table = PriceTable(self.names, prices, self.default) if self.names is not None else None
+        self.prices, self.table = prices, table
+        self.mtime = mtime
+        self.version += 1
+        self.error = None
+        return True
+
+    def poll(self):
+        if time.monotonic() - self.checked < self.check_interval:
+            return False
+        return self.reload()
@@ -0,0 +1,251 @@
+import json
+import os
+import time
+
+# Next to this file, so it's found whatever directory the camera is started from. None ships
+# with the repo (no file means no deals); promotions.example.json shows the format.
+PROMOTION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "promotions.json")
+
+
+def cents(price):
+    return int(round(float(price) * 100))
+
+
+class MultiBuy:
+    # "3 apples for $2.50": every `quantity` of one item together cost price_cents
+    def __init__(self, name, cls, quantity, price_cents):
+        self.name = name
+        self.classes = (cls,)
+        self.cls = cls
+        self.quantity = quantity
+        self.price_cents = price_cents
+
+    def evaluate(self, counts, unit_cents):
+        # (times the deal applies, cents saved)
+        times = int(counts[self.cls]) // self.quantity
+        return times, times * (self.quantity * int(unit_cents[self.cls]) - self.price_cents)
+
+
+class Bundle:
+    # "banana + orange for $4": every complete set of items (class id -> quantity) costs price_cents
+    def __init__(self, name, items, price_cents):
+        self.name = name
+        self.classes = tuple(items)
+        self.items = items
+        self.price_cents = price_cents
+
+    def evaluate(self, counts, unit_cents):
+        times = min(int(counts[cls]) // quantity for cls, quantity in self.items.items())
+        regular = sum(quantity * int(unit_cents[cls]) for cls, quantity in self.items.items())
+        return times, times * (regular - self.price_cents)
+
+
+class ItemDiscount:
+    # "10% off bottles" or "$0.50 off bottles": a discount on every unit of one item
+    def __init__(self, name, cls, percent=0, off_cents=0):
+        self.name = name
+        self.classes = (cls,)
+        self.cls = cls
+        self.percent = percent
+        self.off_cents = off_cents
+
+    def evaluate(self, counts, unit_cents):
+        unit = int(unit_cents[self.cls])
+        off = min(unit, (unit * self.percent + 50) // 100 + self.off_cents)  # Never below free
+        times = int(counts[self.cls])
+        return times, times * off
+
+
+def check_definition(definition):
+    # The shape compile_rules relies on; anything else rejects the whole file (the current
+    # rules stay), like a file that isn't JSON
+    if not isinstance(definition, dict):
+        raise ValueError(f"Bad promotion: {definition!r}")
+    kind = definition.get('type')
+    if kind == 'bundle':
+        items = definition.get('items')
+        if not isinstance(items, dict) or not all(isinstance(item, str) for item in items):
+            raise ValueError(f"Bad promotion {definition}: items must map item names to quantities")
+        amounts = list(items.values())
+    elif kind in ('multibuy', 'discount'):
+        if not isinstance(definition.get('item'), str):
+            raise ValueError(f"Bad promotion {definition}: item must be an item name")
+        amounts = []
+    else:
+        raise ValueError(f"Unknown promotion type: {kind}")
+    amounts += [definition[key] for key in ('quantity', 'price', 'percent', 'off') if key in definition]
+    if not all(isinstance(amount, (int, float)) and not isinstance(amount, bool) for amount in amounts):
+        raise ValueError(f"Bad promotion {definition}: quantities and amounts must be numbers")
+
+
+def compile_rules(definitions, names):
+    # Turn the promotion file's entries into rules on class ids, e.g.
+    #   {"type": "multibuy", "item": "apple", "quantity": 3, "price": 2.5}
+    #   {"type": "bundle", "items": {"banana": 1, "orange": 1}, "price": 4}
+    #   {"type": "discount", "item": "bottle", "percent": 10}   (or "off": 0.5)
+    # An optional "name" is what the checkout shows. Each item can be in one rule only,
+    # so every rule can be worked out on its own; a rule for an item the model doesn't
+    # know, for an item already in an earlier rule, or with a quantity below 1 or a
+    # negative amount, is skipped with a message. A malformed file raises ValueError.
+    if not isinstance(definitions, list):
+        raise ValueError("Promotions must be a list of rules")
+    ids = {str(names[cls]).lower(): cls for cls in range(len(names))}
+    rules = []
+    used = set()
+    for definition in definitions:
+        check_definition(definition)
+        kind = definition['type']
+        items = definition['items'] if kind == 'bundle' else {definition['item']: 1}
+        unknown = [item for item in items if item.lower() not in ids]
+        if unknown:
+            print(f"Skipping promotion {definition}: unknown item {', '.join(unknown)}")
+            continue
+        classes = {ids[item.lower()]: int(quantity) for item, quantity in items.items()}
+        if used & classes.keys():
+            print(f"Skipping promotion {definition}: an item is already in another promotion")
+            continue
+        quantities = list(classes.values()) + ([int(definition['quantity'])] if kind == 'multibuy' else [])
+        if not classes or min(quantities) < 1:
+            print(f"Skipping promotion {definition}: quantities must be at least 1")
+            continue
+        if any(float(definition.get(key, 0)) < 0 for key in ('price', 'percent', 'off')):
+            print(f"Skipping promotion {definition}: price, percent and off can't be negative")
+            continue
+
+        if kind == 'multibuy':
+            (cls, _), = classes.items()
+            name = definition.get('name', f"{definition['quantity']} {names[cls]} for ${definition['price']}")
+            rule = MultiBuy(name, cls, int(definition['quantity']), cents(definition['price']))
+        elif kind == 'bundle':
+            name = definition.get('name', " + ".join(names[cls] for cls in classes) + f" for ${definition['price']}")
+            rule = Bundle(name, classes, cents(definition['price']))
+        elif kind == 'discount':
+            (cls, _), = classes.items()
+            name = definition.get('name', f"Discount on {names[cls]}")
+            rule = ItemDiscount(name, cls, int(definition.get('percent', 0)), cents(definition.get('off', 0)))
+        used |= classes.keys()
+        rules.append(rule)
+    return rules
+
+
+class PromotionEngine:
+    # Applies compiled rules to one cart. Each class id knows the rules it appears in,
+    # so a cart change only re-evaluates those rules and adjusts the running discount
+    # by the difference; an unchanged cart costs nothing however many rules there are.
+    def __init__(self, rules, size):
+        self.rules = rules
+        self.by_class = [[] for _ in range(size)]  # Class id -> indexes of the rules using it
+        for index, rule in enumerate(rules):
+            for cls in rule.classes:
+                self.by_class[cls].append(index)
+        self.applied = [(0, 0)] * len(rules)  # Per rule: (times applied, cents saved)
+        self.discount_cents = 0
+
+    def update(self, classes, counts, unit_cents):
+        # Re-evaluate the rules that use any of these (changed) class ids
+        touched = {index for cls in classes for index in self.by_class[cls]}
+        for index in touched:
+            self.apply(index, counts, unit_cents)
+
+    def update_all(self, counts, unit_cents):
+        # After a price change every rule may come out differently
+        for index in range(len(self.rules)):
+            self.apply(index, counts, unit_cents)
+
+    def apply(self, index, counts, unit_cents):
+        times, saving = self.rules[index].evaluate(counts, unit_cents)
+        if times == 0 or saving <= 0:  # A deal dearer than the regular prices isn't applied
+            times, saving = 0, 0
+        self.discount_cents += saving - self.applied[index][1]
+        self.applied[index] = (times, saving)
+
+    def deals(self):
+        # (rule index, name, times applied, cents saved) for the deals in effect
+        return [(index, self.rules[index].name, times, saving)
+                for index, (times, saving) in enumerate(self.applied) if saving]
+
+
+class PromotionCatalog:
+    # Promotion rules kept in promotions.json (a list of definitions, see compile_rules),
+    # compiled once per file change. Like PriceCatalog, poll() is cheap enough to call every
+    # frame and a file that can't be read keeps the current rules. No file means no deals.
+    def __init__(self, names, path=PROMOTION_FILE, check_interval=1.0):
+        self.names = names  # Class id -> name the rules refer to
+        self.path = path
+        self.check_interval = check_interval
+        self.rules = []
+        self.mtime = 0  # 0 = no file
+        self.checked = 0
+        self.version = 0  # Goes up with every successful reload
+        self.error = None
+        self.reload()
+
+    def reload(self):
+        # Returns True when the rules changed
+        self.checked = time.monotonic()
+        try:
+            mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else 0
+            if mtime == self.mtime:
+                return False
+            rules = []
+            if mtime:
+                with open(self.path) as file:
+                    rules = compile_rules(json.load(file), self.names)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            if str(e) != self.error:
+                print(f"Error loading promotions from {self.path}: {e}")
+                self.error = str(e)
+            self.mtime = None  # Try again on the next check
+            return False
+
+        self.rules = rules
+        self.mtime = mtime
+        self.version += 1
+        self.error = None
+        return True
+
+    def poll(self):
+        if time.monotonic() - self.checked < self.check_interval:
+            return False
+        return self.reload()
+
+
+if __name__ == "__main__":
+    # Self-check: python promotions.py. Malformed promotion files must be turned down
+    # with ValueError (so PromotionCatalog keeps its rules), never crash the camera.
+    import tempfile
+
+    names = ['apple', 'banana', 'orange', 'bottle']
+    bad = [{"type": "bundle", "items": ["banana"], "price": 4},
+           {"type": "multibuy", "item": 5, "quantity": 3, "price": 2.5},
+           {"type": "multibuy", "item": "apple", "quantity": "3", "price": 2.5},
+           {"type": "discount", "item": "bottle", "percent": True},
+           {"type": "coupon", "item": "apple"},
+           "apple"]
+    for definition in bad:
+        try:
+            compile_rules([definition], names)
+        except ValueError:
+            continue
+        raise AssertionError(f"accepted {definition}")
+    for definitions in ({"type": "discount", "item": "bottle", "percent": 10}, None):
+        try:
+            compile_rules(definitions, names)
+        except ValueError:
+            continue
+        raise AssertionError(f"accepted {definitions}")
+
+    good = {"type": "discount", "item": "bottle", "percent": 10}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "promotions.json")
+        with open(path, "w") as file:
+            json.dump([good], file)
+        catalog = PromotionCatalog(names, path)
+        assert len(catalog.rules) == 1 and catalog.version == 1
+        for definition in bad:
+            with open(path, "w") as file:
+                json.dump([good, definition], file)
+            os.utime(path, (catalog.checked + 1, catalog.checked + 1))  # A new mtime for every write
+            assert not catalog.reload() and len(catalog.rules) == 1 and catalog.version == 1, definition
+    assert PromotionCatalog(names, os.path.join(os.path.dirname(PROMOTION_FILE), "missing.json")).rules == []
+    print("promotions.py: all checks passed")
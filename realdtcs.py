@@ -1,9 +1,10 @@
 import cv2
 import threading
+import numpy as np
 from collections import defaultdict
 from ultralytics import YOLO
 import tkinter as tk
-from PIL import Image, ImageTk
+from pricecatalog import PriceCatalog, price_file
 
 
 class MobileCamera:
@@ -13,79 +14,120 @@ class MobileCamera:
         self.running = True
         self.frame_skip = 0
         self.detected_objects = defaultdict(lambda: {'count': 0, 'total': 0})
-        self.prices = {
-            "apple": 1,
-            "banana": 2,
-            "orange": 3,
-            "bottle": 4,
-            "mouse": 5,
-        }
+        # Its own price list (objects not in it aren't billed), reloaded when the file changes
+        self.catalog = PriceCatalog(self.model.names, price_file("prices_realdtcs.json"))
         self.app = app
         self.getVideo(camera_url)
 
     def getVideo(self, camera):
         self.camera = camera
-        cap = cv2.VideoCapture(self.camera)
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 960)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+        self.cap = cv2.VideoCapture(self.camera)
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 960)
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
 
         def capture_frames():
             while self.running:
-                ret, frame = cap.read()
+                ret, frame = self.cap.read()
                 if ret:
                     self.frame = frame
 
-        thread = threading.Thread(target=capture_frames)
-        thread.start()
-
-        while self.running:
-            if self.frame is not None:
-                if self.frame_skip % 2 == 0:
-                    results = self.model(self.frame)
-                    self.detected_objects.clear()
-
-                    for result in results:
-                        boxes = result.boxes
-                        for box in boxes:
-                            x1, y1, x2, y2 = map(int, box.xyxy[0])
-                            conf = box.conf[0]
-                            cls = int(box.cls[0])
-
-                            if conf > 0.5:
-                                cv2.rectangle(self.frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
-                                class_name = self.model.names[cls]
-                                price_tag = self.prices.get(class_name.lower(), 0)
-
-                                if class_name.lower() in self.prices:
-                                    self.detected_objects[class_name]['count'] += 1
-                                    self.detected_objects[class_name]['total'] = self.detected_objects[class_name][
-                                                                                     'count'] * price_tag
-
-                                cv2.putText(self.frame, f"{class_name}: ${price_tag}",
-                                            (x1, y1 - 10),
-                                            cv2.FONT_HERSHEY_SIMPLEX,
-                                            1,
-                                            (0, 255, 0),
-                                            2)
-
-                    self.frame = cv2.cvtColor(self.frame, cv2.COLOR_BGR2RGB)
-                    img = Image.fromarray(self.frame)
-                    img.thumbnail((960, 720), Image.Resampling.LANCZOS)
-                    imgtk = ImageTk.PhotoImage(image=img)
-
-                    self.app.video_label.imgtk = imgtk
-                    self.app.video_label.config(image=imgtk)
-
-                self.frame_skip += 1
-
-            self.app.root.update_idletasks()
-            self.app.root.update()
-
-        cap.release()
-        thread.join()
-        cv2.destroyAllWindows()
-
-
+        self.thread = threading.Thread(target=capture_frames)
+        self.thread.start()
+
+        # Tk drives the loop: process a frame, then give the event loop back until the next tick
+        self.preview = TkPreview(self.app.video_label, (960, 720))
+        self.app.root.after(0, self.update_frame)
+
+    def update_frame(self):
+        if not self.running:
+            return
+
+        frame = self.frame
+        if frame is not None:
+            self.frame = None  # Don't process the same frame twice
+            if self.frame_skip % 2 == 0:
+                results = self.model(frame)
+                self.detected_objects.clear()
+                self.catalog.poll()
+                price_table = self.catalog.table  # Prices indexed by class id
+
+                for result in results:
+                    boxes = result.boxes
+                    for box in boxes:
+                        x1, y1, x2, y2 = map(int, box.xyxy[0])
+                        conf = box.conf[0]
+                        cls = int(box.cls[0])
+
+                        if conf > 0.5:
+                            cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
+                            class_name = self.model.names[cls]
+                            price_tag = price_table.prices[cls].item()
+
+                            if price_table.priced[cls]:
+                                self.detected_objects[class_name]['count'] += 1
+                                self.detected_objects[class_name]['total'] = self.detected_objects[class_name][
+                                                                                 'count'] * price_tag
+
+                            cv2.putText(frame, f"{class_name}: ${price_tag}",
+                                        (x1, y1 - 10),
+                                        cv2.FONT_HERSHEY_SIMPLEX,
+                                        1,
+                                        (0, 255, 0),
+                                        2)
+
+                self.preview.show(frame)
+
+            self.frame_skip += 1
+
+        self.app.root.after(10, self.update_frame)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        self.cap.release()
+
+
+class TkPreview:
+    # Shows BGR frames in a Tk label through one PhotoImage that is reused for the
+    # whole session. The frame is scaled with INTER_AREA and converted to RGB straight
+    # into a preallocated PPM buffer; no PIL image or new PhotoImage per frame, so memory
+    # stays flat over a long shift. Handing the buffer to Tk is not zero-copy: it costs
+    # one bytes copy of the PPM per frame (see show()).
+    def __init__(self, label, max_size):
+        self.label = label
+        self.max_size = max_size  # Frames are shrunk to fit, never enlarged
+        self.photo = tk.PhotoImage(width=max_size[0], height=max_size[1])
+        self.label.config(image=self.photo)
+        self.label.imgtk = self.photo  # Keep a reference so Tk doesn't lose the image
+        self.size = None
+        self.scaled = None  # Preallocated BGR buffer at the display size
+        self.ppm = None  # PPM header followed by the RGB pixels
+        self.rgb = None  # Pixel part of self.ppm as an array, written by cvtColor
+
+    def allocate(self, width, height):
+        header = f"P6 {width} {height} 255\n".encode()
+        self.size = (width, height)
+        self.scaled = np.empty((height, width, 3), dtype=np.uint8)
+        self.ppm = bytearray(len(header) + width * height * 3)
+        self.ppm[:len(header)] = header
+        self.rgb = np.frombuffer(self.ppm, dtype=np.uint8, offset=len(header)).reshape(height, width, 3)
+
+    def show(self, frame):
+        height, width = frame.shape[:2]
+        scale = min(1, self.max_size[0] / width, self.max_size[1] / height)
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        if size != self.size:
+            self.allocate(*size)
+
+        if size == (width, height):
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.rgb)
+        else:
+            cv2.resize(frame, size, dst=self.scaled, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(self.scaled, cv2.COLOR_BGR2RGB, dst=self.rgb)
+        # bytes, not the bytearray itself: _tkinter only hands bytes to Tk as binary data.
+        # A bytearray or memoryview arrives as its repr text, which Tk can't read as an
+        # image, so this copy is the one Tk needs
+        self.photo.configure(data=bytes(self.ppm), width=size[0], height=size[1])
 
 
 class App:
@@ -130,7 +172,7 @@ class App:
 
     def quit(self):
         # Implement quit functionality
-        self.camera.running = False
+        self.camera.stop()
         self.root.quit()
 
 
@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import deque
+
+from detections import box_arrays
+
+
+class InferenceJob:
+    # One frame waiting for (or done with) inference
+    def __init__(self, lane, frame, kind, classes):
+        self.lane = lane
+        self.frame = frame
+        self.kind = kind  # 'scan' or 'preview'
+        self.classes = classes
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.result = None  # (boxes, confs, classes) once done
+        self.dropped = False
+        self.done = threading.Event()
+
+
+class LaneStats:
+    # Queue and wait time figures for one lane
+    def __init__(self):
+        self.scan_wait_ms = 0.0  # Wait of the last scan job before it reached the model
+        self.scan_wait_max_ms = 0.0
+        self.preview_wait_ms = 0.0  # EWMA of preview job waits
+        self.scans = 0
+        self.previews = 0
+        self.dropped = 0  # Preview jobs thrown away under load
+
+    def status(self, depth):
+        return (f"Queue {depth} | preview wait {self.preview_wait_ms:.0f} ms, dropped {self.dropped}"
+                f" | scan wait {self.scan_wait_ms:.0f} ms (max {self.scan_wait_max_ms:.0f})")
+
+
+class InferenceScheduler:
+    # Shares one model between lanes with two queues:
+    #  - scan jobs (the frame that decides a bill) are never dropped, always go to the
+    #    model before any preview work and can use a larger input size;
+    #  - preview jobs are best effort: each lane has at most one pending, a newer frame
+    #    replaces it, and jobs that waited longer than max_preview_wait are dropped.
+    # A single thread runs the model, so a scan waits at most for the batch in flight.
+    def __init__(self, model, skip_controller, scan_imgsz=960, max_batch=8, max_preview_wait=0.5):
+        self.model = model
+        self.skip_controller = skip_controller  # Picks the preview imgsz, fed with preview latency
+        self.scan_imgsz = scan_imgsz  # Input size for scan jobs
+        self.max_batch = max_batch
+        self.max_preview_wait = max_preview_wait  # Seconds before a preview frame is too old to bother
+        self.condition = threading.Condition()
+        self.scans = deque()
+        self.previews = {}  # lane -> pending preview job
+        self.stats = {}  # lane -> LaneStats
+        self.running = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.running = True
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.thread.join()
+
+    def lane_stats(self, lane):
+        return self.stats.setdefault(lane, LaneStats())
+
+    def depth(self, lane):
+        with self.condition:
+            return sum(job.lane == lane for job in self.scans) + (lane in self.previews)
+
+    def submit_scan(self, lane, frame, classes=None):
+        job = InferenceJob(lane, frame, 'scan', classes)
+        with self.condition:
+            self.scans.append(job)
+            self.condition.notify()
+        return job
+
+    def submit_preview(self, lane, frame, classes=None):
+        job = InferenceJob(lane, frame, 'preview', classes)
+        with self.condition:
+            old = self.previews.pop(lane, None)
+            if old is not None:
+                self.drop(old)
+            self.previews[lane] = job
+            self.condition.notify()
+        return job
+
+    def drop(self, job):
+        job.dropped = True
+        self.lane_stats(job.lane).dropped += 1
+        job.done.set()
+
+    def next_batch(self):
+        # Called with the condition held: scan jobs first, otherwise a batch of previews
+        if self.scans:
+            return [self.scans.popleft()], self.scan_imgsz
+
+        now = time.perf_counter()
+        batch = []
+        for lane, job in list(self.previews.items()):
+            if now - job.submitted > self.max_preview_wait:
+                del self.previews[lane]
+                self.drop(job)
+            elif len(batch) < self.max_batch and (not batch or job.classes == batch[0].classes):
+                # One model call takes one class filter
+                del self.previews[lane]
+                batch.append(job)
+        return batch, self.skip_controller.imgsz
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.scans or self.previews or not self.running)
+                if not self.running:
+                    break
+                batch, imgsz = self.next_batch()
+            if batch:
+                self.infer(batch, imgsz)
+
+    def infer(self, batch, imgsz):
+        started = time.perf_counter()
+        for job in batch:
+            job.started = started
+            stats = self.lane_stats(job.lane)
+            wait_ms = (started - job.submitted) * 1000
+            if job.kind == 'scan':
+                stats.scans += 1
+                stats.scan_wait_ms = wait_ms
+                stats.scan_wait_max_ms = max(stats.scan_wait_max_ms, wait_ms)
+            else:
+                stats.previews += 1
+                stats.preview_wait_ms += 0.2 * (wait_ms - stats.preview_wait_ms)
+
+        results = self.model([job.frame for job in batch], imgsz=imgsz, classes=batch[0].classes, verbose=False)
+        if batch[0].kind == 'preview':
+            self.skip_controller.record(time.perf_counter() - started)
+
+        for job, result in zip(batch, results):
+            job.result = box_arrays([result], conf_threshold=0.25)
+            job.done.set()
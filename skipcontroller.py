@@ -0,0 +1,72 @@
+import math
+
+
+def preview_sizes(preview_imgsz, ladder=(640, 480, 320, 256)):
+    # The controller's imgsz ladder for a preview tier capped at preview_imgsz
+    return tuple(size for size in ladder if size <= preview_imgsz) or (preview_imgsz,)
+
+
+class FrameSkipController:
+    # Decides how often the detector runs, based on how long inference actually
+    # takes on this machine instead of a hard-coded "every 2nd frame".
+    # Inference time is smoothed with an EWMA and compared with a per-frame budget:
+    # the share of each camera frame interval we are willing to spend on the model.
+    # The stride (run on every Nth frame) is raised until the average cost per camera
+    # frame fits the budget; when the stride is maxed out, or a single inference is
+    # slower than max_latency_ms, the model input size is stepped down as well.
+    def __init__(self, camera_fps=30, cpu_share=0.5, max_latency_ms=200, max_stride=8,
+                 sizes=(640, 480, 320), alpha=0.2, settle=5):
+        self.budget_ms = 1000.0 * cpu_share / camera_fps  # Inference time allowed per camera frame
+        self.max_latency_ms = max_latency_ms  # Slowest acceptable single inference
+        self.max_stride = max_stride
+        self.sizes = sizes  # Model input sizes (imgsz) to pick from, largest first
+        self.alpha = alpha  # EWMA smoothing factor, higher reacts faster
+        self.settle = settle  # Inferences to wait after a change before changing again
+        self.stride = 2  # Run the model on every Nth frame (2 = the old fixed schedule)
+        self.size_index = 0
+        self.latency_ms = None  # EWMA of inference time in milliseconds
+        self.samples_since_change = 0
+
+    @property
+    def imgsz(self):
+        # Model input size to use, or None when there is nothing to choose from
+        return self.sizes[self.size_index] if self.sizes else None
+
+    def record(self, seconds):
+        # Feed in the measured duration of one inference
+        elapsed_ms = seconds * 1000.0
+        if self.latency_ms is None:
+            self.latency_ms = elapsed_ms
+        else:
+            self.latency_ms += self.alpha * (elapsed_ms - self.latency_ms)
+
+        self.samples_since_change += 1
+        if self.samples_since_change >= self.settle:
+            self.adjust()
+
+    def adjust(self):
+        wanted_stride = max(1, math.ceil(self.latency_ms / self.budget_ms))
+        size_index = self.size_index
+
+        if (wanted_stride > self.max_stride or self.latency_ms > self.max_latency_ms) \
+                and size_index < len(self.sizes) - 1:
+            # Too slow even when skipping as much as we allow: shrink the input
+            size_index += 1
+        elif wanted_stride == 1 and self.latency_ms < self.budget_ms / 2 and size_index > 0:
+            # Plenty of headroom: go back to a larger, more accurate input
+            size_index -= 1
+
+        stride = min(wanted_stride, self.max_stride)
+        if stride != self.stride or size_index != self.size_index:
+            self.stride = stride
+            if size_index != self.size_index:
+                self.size_index = size_index
+                # The old average was measured at another input size
+                self.latency_ms = None
+            self.samples_since_change = 0
+
+    def status(self):
+        # One line for the on-screen overlay
+        latency = f"{self.latency_ms:.0f}" if self.latency_ms is not None else "-"
+        size = f" imgsz {self.imgsz}" if self.imgsz else ""
+        return f"Stride {self.stride}{size} | infer {latency} ms, budget {self.budget_ms * self.stride:.0f} ms"
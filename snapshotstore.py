@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+import cv2
+
+from cart import format_cents
+from snapshotwriter import SnapshotWriter
+
+
+class SnapshotStore:
+    # Archive of captured checkout photos. Each file is named by the SHA-256 of its
+    # encoded bytes and sits in two levels of shard directories (ab/cd/abcd...jpg), so
+    # no directory grows huge, nothing is ever overwritten and identical frames are
+    # stored once. A SQLite index maps lane, time, cart and total to each photo;
+    # rows are committed in batches rather than one transaction per capture.
+    # Encoding and writing run on a SnapshotWriter's threads.
+    # One store per process: lanes share it (see multilane.py) rather than each
+    # opening its own connection to the same index.
+    def __init__(self, root='snapshots', file_format='jpg', quality=90, workers=2, max_pending=8,
+                 batch_size=32):
+        self.root = root
+        self.batch_size = batch_size  # Rows per transaction while captures keep coming
+        self.uncommitted = 0
+        os.makedirs(root, exist_ok=True)
+
+        # Shared by the writer threads, one at a time under db_lock
+        self.db = sqlite3.connect(os.path.join(root, 'index.db'), check_same_thread=False)
+        self.db_lock = threading.Lock()
+        self.db.execute("PRAGMA journal_mode=WAL")  # Lookups don't block the writers
+        self.db.execute("""CREATE TABLE IF NOT EXISTS captures (
+                               id INTEGER PRIMARY KEY,
+                               lane INTEGER,
+                               taken REAL,
+                               sha256 TEXT,
+                               path TEXT,
+                               cart TEXT,
+                               total_cents INTEGER)""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS captures_taken ON captures (taken)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS captures_lane_taken ON captures (lane, taken)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS captures_sha256 ON captures (sha256)")
+        self.db.commit()
+
+        self.writer = SnapshotWriter(file_format, quality, workers, max_pending, save=self.save)
+        self.extension = self.writer.extension
+
+    def record(self, image, lane=1, cart=(), total=0):
+        # Queue a captured photo with what was billed for it.
+        # cart: (item, price, count, total) rows as shown on the checkout screen,
+        # money in integer cents like total
+        self.writer.queue.put((image, lane, time.time(), list(cart), total))
+
+    def save(self, image, lane, taken, cart, total):
+        # Runs on a writer thread for every recorded photo
+        ok, encoded = cv2.imencode(self.extension, image, self.writer.params)
+        if not ok:
+            return False
+        data = encoded.tobytes()
+        digest = hashlib.sha256(data).hexdigest()
+        relative = os.path.join(digest[:2], digest[2:4], digest + self.extension)
+        path = os.path.join(self.root, relative)
+
+        if not os.path.exists(path):  # Otherwise the same picture is already stored
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write under a temporary name first so a crash never leaves half a file under the hash
+            temporary = f"{path}.{threading.get_ident()}.tmp"
+            with open(temporary, 'wb') as file:
+                file.write(data)
+            os.replace(temporary, path)
+
+        with self.db_lock:
+            try:
+                self.db.execute("INSERT INTO captures (lane, taken, sha256, path, cart, total_cents) "
+                                "VALUES (?, ?, ?, ?, ?, ?)", (lane, taken, digest, relative, json.dumps(cart), total))
+                self.uncommitted += 1
+                # Commit a full batch, or whatever has gathered once the burst is over
+                if self.uncommitted >= self.batch_size or self.writer.queue.empty():
+                    self.db.commit()
+                    self.uncommitted = 0
+            except sqlite3.Error as e:
+                # The photo is on disk under its hash; only its index row is lost
+                print(f"Error indexing photo {relative}: {e}")
+                return False
+        return True
+
+    def find(self, start, end, lane=None):
+        # Captures taken between two datetimes (optionally on one lane), oldest first,
+        # as (lane, taken datetime, photo path, cart rows, total in cents)
+        query = "SELECT lane, taken, path, cart, total_cents FROM captures WHERE taken BETWEEN ? AND ?"
+        args = [start.timestamp(), end.timestamp()]
+        if lane is not None:
+            query = "SELECT lane, taken, path, cart, total_cents FROM captures WHERE lane = ? AND taken BETWEEN ? AND ?"
+            args.insert(0, lane)
+        with self.db_lock:
+            rows = self.db.execute(query + " ORDER BY taken", args).fetchall()
+        return [(row_lane, datetime.fromtimestamp(taken), os.path.join(self.root, path), json.loads(cart), total)
+                for row_lane, taken, path, cart, total in rows]
+
+    def flush(self):
+        self.writer.flush()
+        with self.db_lock:
+            self.db.commit()
+            self.uncommitted = 0
+
+    def close(self):
+        self.writer.close()
+        with self.db_lock:
+            self.db.commit()
+            self.db.close()
+
+
+if __name__ == "__main__":
+    # Look up captures: python snapshotstore.py 2024-05-01T09:00 2024-05-01T18:00 [lane]
+    store = SnapshotStore(workers=0)
+    lane = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    for lane, taken, path, cart, total in store.find(datetime.fromisoformat(sys.argv[1]),
+                                                     datetime.fromisoformat(sys.argv[2]), lane):
+        items = ", ".join(f"{count} x {item}" for item, price, count, item_total in cart)
+        print(f"{taken:%Y-%m-%d %H:%M:%S}  lane {lane}  ${format_cents(total)}  {items}  {path}")
+    store.close()
@@ -0,0 +1,72 @@
+import queue
+import threading
+
+import cv2
+
+# File extension and cv2.imwrite quality flag for each supported format
+FORMATS = {
+    'jpg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY),
+    'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY),
+    'png': ('.png', cv2.IMWRITE_PNG_COMPRESSION),
+}
+
+
+class SnapshotWriter:
+    # Encodes and writes captured photos on background threads, so Scan doesn't wait
+    # on the encoder and the disk. The queue is bounded: if the disk falls behind,
+    # submit() blocks instead of piling up frames in memory. Photos are never dropped.
+    # The caller hands over the image and must not draw on it afterwards.
+    def __init__(self, file_format='jpg', quality=90, workers=2, max_pending=8, save=None):
+        # quality: 0-100 for jpg and webp, zlib level 0-9 for png
+        # save: called as save(*job) for each queued job instead of writing (path, image)
+        # with cv2.imwrite (SnapshotStore queues its own jobs this way)
+        self.extension, flag = FORMATS[file_format]
+        self.params = [flag, quality]
+        self.save_job = save or self.save
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.written = 0
+        self.failed = 0
+        self.lock = threading.Lock()  # Guards the counters
+        self.threads = [threading.Thread(target=self.run, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, name, image):
+        # Queue image to be saved as name + extension; returns the file name
+        path = name + self.extension
+        self.queue.put((path, image))
+        return path
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                self.queue.task_done()
+                break
+            ok = False
+            try:
+                ok = self.save_job(*job)
+            except Exception as e:  # Whatever goes wrong, keep the thread alive for the next photo
+                print(f"Error saving photo: {e}")
+            finally:
+                with self.lock:
+                    if ok:
+                        self.written += 1
+                    else:
+                        self.failed += 1
+                self.queue.task_done()  # Otherwise flush() and close() would wait forever
+
+    def save(self, path, image):
+        # Runs on a writer thread for every queued photo; returns True once it is on disk
+        return cv2.imwrite(path, image, self.params)
+
+    def flush(self):
+        # Wait until every queued photo is on disk
+        self.queue.join()
+
+    def close(self):
+        self.flush()
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
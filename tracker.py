@@ -0,0 +1,127 @@
+import itertools
+
+import numpy as np
+
+
+def iou_matrix(a, b):
+    # Pairwise IoU between two sets of xyxy boxes, shape (len(a), len(b))
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)))
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def greedy_match(ious, threshold):
+    # Pair rows and columns with the highest IoU first; returns (row, col) pairs
+    pairs = []
+    if ious.size == 0:
+        return pairs
+    used_rows = set()
+    used_cols = set()
+    for flat in np.argsort(-ious, axis=None):
+        row, col = divmod(int(flat), ious.shape[1])
+        if ious[row, col] < threshold:
+            break
+        if row not in used_rows and col not in used_cols:
+            pairs.append((row, col))
+            used_rows.add(row)
+            used_cols.add(col)
+    return pairs
+
+
+class Track:
+    # One physical object followed across frames
+    def __init__(self, track_id, box, cls):
+        self.id = track_id
+        self.box = box.astype(float)  # Last known xyxy box
+        self.velocity = np.zeros(4)  # Box change per update, for a constant-velocity prediction
+        self.class_votes = {int(cls): 1}  # Classes this object was detected as, majority wins
+        self.hits = 1  # Updates in which the object was detected
+        self.misses = 0  # Updates since it was last detected
+
+    @property
+    def cls(self):
+        return max(self.class_votes, key=self.class_votes.get)
+
+    def predict(self):
+        # Where the box should be now if it kept moving the same way
+        return self.box + self.velocity
+
+    def update(self, box, cls):
+        self.velocity = 0.5 * self.velocity + 0.5 * (box - self.box)
+        self.box = box.astype(float)
+        self.class_votes[int(cls)] = self.class_votes.get(int(cls), 0) + 1
+        self.hits += 1
+        self.misses = 0
+
+
+class ObjectTracker:
+    # Lightweight ByteTrack-style tracker: confident detections are matched to the
+    # existing tracks by IoU first, then the leftover low-confidence detections get a
+    # second chance against the tracks that are still unmatched. A track has to be
+    # seen min_hits times before it counts, and survives max_age missed updates, so a
+    # box whose confidence wobbles around the threshold no longer flickers in the cart.
+    def __init__(self, high_conf=0.5, match_iou=0.3, min_hits=2, max_age=5, stable_after=10):
+        self.high_conf = high_conf  # Detections at or above this may start new tracks
+        self.match_iou = match_iou  # Minimum IoU between prediction and detection to match
+        self.min_hits = min_hits  # Detections needed before a track is confirmed
+        self.max_age = max_age  # Missed updates before a track is dropped
+        self.stable_after = stable_after  # Updates without tracks coming or going to count as stable
+        self.tracks = []
+        self.ids = itertools.count(1)
+        self.quiet_updates = 0  # Updates in a row where no confirmed track appeared or disappeared
+
+    def update(self, boxes, confs, classes):
+        confirmed_before = {track.id for track in self.confirmed()}
+        predictions = np.array([track.predict() for track in self.tracks]).reshape(-1, 4)
+
+        high = np.flatnonzero(confs >= self.high_conf)
+        low = np.flatnonzero(confs < self.high_conf)
+
+        # First pass: confident detections against every track
+        pairs = greedy_match(iou_matrix(predictions, boxes[high]), self.match_iou)
+        matched_tracks = {row for row, _ in pairs}
+        for row, col in pairs:
+            self.tracks[row].update(boxes[high[col]], classes[high[col]])
+        unmatched_high = np.delete(high, [col for _, col in pairs])
+
+        # Second pass: weak detections only keep existing tracks alive
+        remaining = [row for row in range(len(self.tracks)) if row not in matched_tracks]
+        pairs = greedy_match(iou_matrix(predictions[remaining], boxes[low]), self.match_iou)
+        for row, col in pairs:
+            self.tracks[remaining[row]].update(boxes[low[col]], classes[low[col]])
+            matched_tracks.add(remaining[row])
+
+        for row, track in enumerate(self.tracks):
+            if row not in matched_tracks:
+                track.misses += 1
+                track.box = track.predict()
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_age]
+
+        # Confident detections nobody claimed are new objects
+        for index in unmatched_high:
+            self.tracks.append(Track(next(self.ids), boxes[index], classes[index]))
+
+        if {track.id for track in self.confirmed()} == confirmed_before:
+            self.quiet_updates += 1
+        else:
+            self.quiet_updates = 0
+
+    def confirmed(self):
+        return [track for track in self.tracks if track.hits >= self.min_hits]
+
+    def seen(self):
+        # Confirmed tracks plus the ones the last update started from confident detections
+        return [track for track in self.tracks if track.hits >= self.min_hits or track.misses == 0]
+
+    @property
+    def stable(self):
+        # True when the same objects have been on the counter for a while,
+        # so the detector can afford to run less often
+        return self.quiet_updates >= self.stable_after